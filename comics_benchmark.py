@@ -0,0 +1,296 @@
+""" Benchmark hot paths against synthetic collections
+
+    Usage: python comics_benchmark.py [--sizes 1000 10000 100000] [--repeat 3] [--seed 0] [--output results.json]
+
+    Every size gets its own generated database in a temporary directory. Timings are written as JSON, so runs of
+    different versions can be compared.
+"""
+from os import environ
+# keep kivy from parsing the benchmark's command line arguments
+environ.setdefault('KIVY_NO_ARGS', '1')
+
+from argparse import ArgumentParser
+from datetime import datetime
+from json import dump
+from os.path import join
+from platform import platform, python_version
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+from types import SimpleNamespace
+
+from comics_issues import OwnedIssues, convert_issue_number
+from comics_collation import COLLATION
+from comics_database import ConnectionManager
+from comics_queries import Queries
+from comics_search import search_titles
+from comics_suggestions import SuggestionIndex
+from comics_titles import DECODERS, TitleRow
+from comics_widgets import ComicListWidget
+from main import ComicsApp
+from screen_home import ScreenHome
+from screen_new import ScreenNew
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+WORDS = ('amazing', 'spider', 'man', 'batman', 'detective', 'comics', 'hellboy', 'saga', 'invincible', 'walking',
+         'dead', 'x-men', 'uncanny', 'avengers', 'justice', 'league', 'green', 'lantern', 'flash', 'wonder', 'woman',
+         'daredevil', 'fantastic', 'four', 'hulk', 'thor', 'iron', 'captain', 'america', 'sandman', 'preacher',
+         'fables', 'spawn', 'witchblade', 'conan', 'star', 'wars', 'aliens', 'predator', 'punisher', 'moon', 'knight')
+PUBLISHERS = ('Boom! Studios', 'IDW', 'Dynamite', 'Valiant', 'Oni Press', 'Vertigo', 'Wildstorm', 'Archie')
+FORMATS = ('Comic', 'Trade Paperback', 'Hardcover', 'Omnibus', 'Digital')
+GROUPS = ('Spider-Man', 'Batman', 'X-Men', 'Avengers', 'Hellboy Universe', 'Star Wars', 'Vertigo Classics')
+NOTES = ('Signed copy', 'Missing cover', 'First appearance', 'Variant cover', 'Second printing', 'Water damage')
+
+
+def generate_title(rand, publisher_ids):
+    """ Return a random title, as ScreenNew.data would hold it on submit """
+
+    title = ' '.join(rand.choice(WORDS) for _ in range(rand.randint(1, 4))).title()
+    if rand.random() < .3:
+        title = 'The ' + title
+
+    # ongoing series have a '+' appended to their issue count
+    total = rand.randint(1, 300)
+    standard_issues = '{}+'.format(total) if rand.random() < .2 else total
+
+    odd_issues = []
+    if rand.random() < .4:
+        odd_issues = rand.sample([0, -1, 1.5, '1a', '2_b', '{}_'.format(total), '{}.5'.format(total)], rand.randint(1, 4))
+
+    owned = 'complete'
+    if rand.random() > .15:
+        # a few runs of consecutive issues, as real collections tend to have
+        owned = OwnedIssues()
+        for _ in range(rand.randint(1, 5)):
+            first = rand.randint(1, total)
+            for issue in range(first, min(first + rand.randint(0, 40), total) + 1):
+                owned.add(issue)
+        for issue in odd_issues:
+            if rand.random() < .5:
+                owned.add(issue)
+
+    other_editions = {}
+    if rand.random() < .2:
+        years = list(range(rand.randint(1970, 2000), rand.randint(2001, 2018)))
+        other_editions['Annuals'] = {'owned_issues': OwnedIssues(rand.sample(years, rand.randint(0, len(years)))),
+                                     'issues': years}
+    if rand.random() < .1:
+        issues = rand.randint(1, 12)
+        other_editions['TPB'] = {'owned_issues': OwnedIssues(range(1, rand.randint(1, issues) + 1)),
+                                 'no_of_issues': issues}
+
+    issue_notes = {}
+    for _ in range(rand.choice((0, 0, 0, 1, 3))):
+        issue_notes[rand.randint(1, total)] = rand.choice(NOTES)
+
+    start = rand.randint(1960, 2018)
+    crossover = rand.random() < .02
+    return {
+        'publisher_id': None if crossover else rand.choice(publisher_ids),
+        'publishers': rand.sample(publisher_ids, 2) if crossover else None,
+        'title': title,
+        'volume': rand.choice((None, None, 1, 2, 3)),
+        'format': rand.randint(1, len(FORMATS)),
+        'standard_issues': standard_issues,
+        'odd_issues': odd_issues,
+        'owned_issues': owned,
+        'other_editions': other_editions,
+        'start_date': str(start),
+        'end_date': None if isinstance(standard_issues, str) else str(rand.randint(start, 2018)),
+        'grouping': rand.choice((None, None, rand.randint(1, len(GROUPS)))),
+        'notes': rand.choice(NOTES) if rand.random() < .3 else '',
+        'issue_notes': issue_notes,
+    }
+
+
+def create_database(db_path, count, seed=0):
+    """ Create a database at db_path holding count random titles """
+
+    rand = Random(seed)
+    app = ComicsApp()
+    app.db_path = db_path
+    app.create_comics_database()
+
+    cur = app.db_cursor()
+    queries = app.database.writer_queries
+    for p in PUBLISHERS:
+        app.add_publisher(queries, cur, p)
+    queries.executemany('insert_format', [(f,) for f in FORMATS], cur)
+    queries.executemany('insert_group', [(g, None) for g in GROUPS], cur)
+    publisher_ids = [p[0] for p in cur.execute("SELECT id FROM PUBLISHERS")]
+
+    for _ in range(count):
+        title = generate_title(rand, publisher_ids)
+        queries.execute('insert_title', queries.title_parameters(title), cur)
+        if title['publishers']:
+            app.add_title_publishers(queries, cur, cur.lastrowid, title['publishers'])
+    app.conn.commit()
+    app.database.close()
+
+
+def time_call(func, repeat):
+    """ Return best and mean seconds of repeat calls to func, and what the last call returned """
+
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        times.append(perf_counter() - start)
+    return {'best': min(times), 'mean': sum(times) / len(times)}, result
+
+
+class HomeList(object):
+    """ The parts of ScreenHome loading pages of titles, without building its widgets, whose kv rules need a window """
+
+    page_size = ScreenHome.page_size
+    title_sort_key = staticmethod(ScreenHome.title_sort_key)
+    load_page = ScreenHome.load_page
+
+
+def walk_pages(screen, queries):
+    """ Fetch every page of titles the way the home list does while scrolling, returning the number of titles """
+
+    total = 0
+    page = screen.load_page(queries)
+    while page:
+        total += len(page)
+        if len(page) < screen.page_size:
+            break
+        page = screen.load_page(queries, '', (screen.title_sort_key(page[-1]), page[-1]['id']))
+    return total
+
+
+def title_memory(queries):
+    """ Return bytes per title of all titles loaded as dicts decoded up front, as title rows, and as title rows with
+        every field decoded
+    """
+
+    def dict_titles():
+        """ Titles the way the home list used to hold them, before title rows """
+        cur = queries.execute('all_titles')
+        keys = [d[0] for d in cur.description]
+        return [{k: DECODERS[k](v) if k in DECODERS else v for k, v in zip(keys, row)} for row in cur]
+
+    def title_rows():
+        return TitleRow.from_cursor(queries.execute('all_titles'))
+
+    def opened_title_rows():
+        titles = title_rows()
+        for t in titles:
+            for field in DECODERS:
+                t[field]
+        return titles
+
+    sizes = {}
+    for name, load in (('dict_titles', dict_titles), ('title_rows', title_rows),
+                       ('opened_title_rows', opened_title_rows)):
+        tracemalloc.start()
+        titles = load()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        sizes[name] = size / len(titles) if titles else None
+        del titles
+    return sizes
+
+
+def benchmark_size(count, repeat, seed):
+    """ Generate a collection of count titles and time every hot path on it """
+
+    results = {}
+
+    def record(name, func, items):
+        """ Time func, storing its timings along with the number of items it handled """
+        timing, result = time_call(func, repeat)
+        timing['items'] = items
+        timing['per_item_us'] = 1e6 * timing['best'] / items if items else None
+        results[name] = timing
+        print("{:>8} {:<28}{:>10.2f}ms".format(count, name, 1000 * timing['best']))
+        return result
+
+    with TemporaryDirectory() as tmp:
+        db_path = join(tmp, 'benchmark.db')
+        timing, _ = time_call(lambda: create_database(db_path, count, seed), 1)
+        results['create_database'] = dict(timing, items=count, per_item_us=1e6 * timing['best'] / count)
+
+        database = ConnectionManager(db_path)
+        try:
+            queries = database.reader()
+            screen = HomeList()
+            record('first_page', lambda: screen.load_page(queries), screen.page_size)
+            record('all_pages', lambda: walk_pages(screen, queries), count)
+
+            cur = queries.execute('all_titles')
+            rows = cur.fetchall()
+            columns = {d[0]: i for i, d in enumerate(cur.description)}
+            titles = record('title_rows', lambda: [TitleRow(columns, r) for r in rows], count)
+            # what opening every title would cost, decoding all of its JSON fields on fresh rows
+            record('decode_titles', lambda: [[TitleRow(columns, r)[f] for f in DECODERS] for r in rows], count)
+
+            # home screen filter, fetching the first page of titles starting with a few letters of a title
+            filters = [COLLATION.prefix_key(t['title'][:n]) for t in titles[::max(1, count // 200)] for n in (1, 3, 6)]
+
+            record('filter_first_page', lambda: [screen.load_page(queries, f) for f in filters], len(filters))
+
+            # whole words, prefixes, words of notes and issue notes, publishers and a combination of words
+            searches = WORDS[:8] + ('spi', 'bat', 'signed', 'cover', 'dynamite', 'amazing spider', 'dead walk')
+            record('search_titles', lambda: [search_titles(queries, s) for s in searches], len(searches))
+
+            memory = results['memory_bytes_per_title'] = title_memory(queries)
+            for name, size in memory.items():
+                print("{:>8} {:<28}{:>10.0f}B per title".format(count, name, size))
+
+            publishers = [p[0] for p in queries.execute('publisher_names')]
+            groups = [g[0] for g in queries.execute('group_names')]
+        finally:
+            database.close()
+
+    record('sort_ignore_prefix', lambda: ScreenHome.sort_ignore_prefix(titles), count)
+
+    # records only need the fields get_progress reads, decoded before timing
+    rows = [{'standard_issues': t['standard_issues'], 'odd_issues': t['odd_issues'],
+             'owned_issues': t['owned_issues']} for t in titles]
+    record('get_progress', lambda: [ComicListWidget.get_progress(r) for r in rows], count)
+
+    issue_texts = [str(i) for t in titles if t['owned_issues'] != 'complete' for i in t['owned_issues']]
+    record('convert_issue_number', lambda: [convert_issue_number(i) for i in issue_texts], len(issue_texts))
+
+    screens = [(SimpleNamespace(standard_issues=range(1, int(str(t['standard_issues']).rstrip('+')) + 1)),
+                ', '.join(str(i) for i in t['odd_issues'])) for t in titles if t['odd_issues']]
+    record('create_odd_issues_lists', lambda: [ScreenNew.create_odd_issues_lists(s, odd) for s, odd in screens],
+           len(screens))
+
+    words = [t['title'] for t in titles] + publishers + groups
+    index = record('suggestion_index_build', lambda: SuggestionIndex(words), len(words))
+    prefixes = [w[:n] for w in words for n in (1, 3, 6)]
+    record('suggest', lambda: [index.suggest(p) for p in prefixes], len(prefixes))
+
+    record('title_parameters', lambda: [Queries.title_parameters(t) for t in titles], count)
+    return results
+
+
+def run(sizes=DEFAULT_SIZES, repeat=3, seed=0):
+    """ Return benchmark results of every collection size """
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': python_version(),
+        'platform': platform(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': {str(count): benchmark_size(count, repeat, seed) for count in sizes},
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Time hot paths against synthetic comic collections")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="number of titles per collection")
+    parser.add_argument('--repeat', type=int, default=3, help="times every hot path is run, the best time counts")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the collection generator")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file to write results to")
+    args = parser.parse_args()
+
+    with open(args.output, 'w') as f:
+        dump(run(args.sizes, args.repeat, args.seed), f, indent=2)
+    print("Results written to {}".format(args.output))
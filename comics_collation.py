@@ -0,0 +1,121 @@
+""" Sort keys of titles, computed once per title and stored in TITLES.sort_key
+
+    Keys ignore a leading article of any configured language, case and accents, and compare numbers by value,
+    so 'The Amazing Spider-Man' sorts under a, 'Élektra' next to 'Elektra' and 'Vol. 2' before 'Vol. 10'.
+    After changing LANGUAGES or ARTICLES, recompute the stored keys with: python comics_collation.py [database path]
+"""
+from re import compile, escape
+from sqlite3 import connect
+from sys import argv
+from unicodedata import combining, normalize
+
+# leading articles ignored when sorting, per language. Elided articles, like l', are followed by the word directly
+ARTICLES = {
+    'en': ('the', 'a', 'an'),
+    'fr': ('le', 'la', 'les', "l'"),
+    'es': ('el', 'la', 'los', 'las'),
+    'de': ('der', 'die', 'das'),
+}
+
+# languages of the collection, whose articles get ignored
+LANGUAGES = ('en', 'fr', 'es', 'de')
+
+# numbers are zero padded to this many digits, so they compare by value
+NUMBER_WIDTH = 10
+NUMBER = compile(r'\d+')
+WHITESPACE = compile(r'\s+')
+
+# separates a title's key from its volume's, sorting below any character of a title
+VOLUME_SEPARATOR = '\x01'
+
+# appended to a key prefix, sorts after every key starting with that prefix
+KEY_END = '\U0010ffff'
+
+
+class Collation(object):
+    """ Sort keys for titles of the given languages
+
+        Keys are plain strings, so they sort the same in Python and, with the default BINARY collation, in SQLite.
+    """
+
+    def __init__(self, languages=LANGUAGES):
+        articles = sorted({a for language in languages for a in ARTICLES[language]}, key=len, reverse=True)
+        spaced = '|'.join(escape(a) for a in articles if not a.endswith("'"))
+        elided = '|'.join(escape(a) for a in articles if a.endswith("'"))
+        # an article is only ignored if a word follows it, so a title like 'A' keeps its key
+        self.article = compile(r"^(?:(?:{})\s|{})(?=\S)".format(spaced or '(?!)', elided or '(?!)'))
+        # keys by title text
+        self.cache = {}
+
+    @staticmethod
+    def fold(text):
+        """ Return text case folded, without accents and with single spaces between words """
+        text = ''.join(c for c in normalize('NFKD', text) if not combining(c))
+        return WHITESPACE.sub(' ', text.casefold()).strip()
+
+    @staticmethod
+    def pad_numbers(text):
+        """ Return text with every number zero padded to NUMBER_WIDTH digits """
+        return NUMBER.sub(lambda m: m.group().zfill(NUMBER_WIDTH), text)
+
+    def text_key(self, text):
+        """ Return key of text, ignoring case, accents and a leading article """
+        try:
+            return self.cache[text]
+        except KeyError:
+            key = self.cache[text] = self.pad_numbers(self.article.sub('', self.fold(text)))
+            return key
+
+    def key(self, title, volume=None):
+        """ Return sort key of title, followed by its volume, so volumes of a title sort by number """
+        key = self.text_key(title)
+        if volume is not None and volume != '':
+            key += VOLUME_SEPARATOR + self.text_key(str(volume))
+        return key
+
+    def prefix_key(self, text):
+        """ Return the key that keys of titles starting with text start with, eg. for filtering titles as typed
+
+            A number at the end of text may still be incomplete, so it isn't part of the key. Text that is a number
+            only, like the start of '2000 AD', is taken as complete number though, so titles get filtered by it
+            instead of all of them being listed.
+        """
+        text = self.article.sub('', self.fold(text))
+        if not NUMBER.fullmatch(text):
+            text = text.rstrip('0123456789')
+        return self.pad_numbers(text)
+
+    def compare(self, a, b):
+        """ Compare two titles like their keys, as SQLite collation """
+        a, b = self.text_key(a), self.text_key(b)
+        return (a > b) - (a < b)
+
+
+# collation of the configured languages, used by the app and the database
+COLLATION = Collation()
+
+
+def title_sort_key(title, volume=None):
+    """ Return sort key of title and its volume """
+    return COLLATION.key(title, volume)
+
+
+def register_collation(conn, collation=COLLATION):
+    """ Make the title_sort_key function and the TITLE collation available on connection """
+    # variable number of arguments, volume is optional
+    conn.create_function('title_sort_key', -1, collation.key)
+    conn.create_collation('TITLE', collation.compare)
+
+
+def rebuild_sort_keys(db_cursor):
+    """ Recompute the sort key of every title, eg. after the configured articles changed """
+    db_cursor.execute("UPDATE TITLES SET sort_key = title_sort_key(title, volume)")
+    print("Sort keys of {} titles updated".format(db_cursor.rowcount))
+
+
+if __name__ == '__main__':
+    conn = connect(argv[1] if len(argv) > 1 else 'database/ComicsDatabase.db')
+    register_collation(conn)
+    rebuild_sort_keys(conn.cursor())
+    conn.commit()
+    conn.close()
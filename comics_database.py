@@ -0,0 +1,207 @@
+""" Connections to the comics database, safe to use from several threads
+
+    The database runs in WAL mode, so readers keep reading the last committed state while a write is in progress and
+    neither blocks the other. Every thread reading from the database gets a read only connection of its own, all
+    writes go through the single writer connection, one transaction at a time.
+    DatabaseExecutor runs writes and slow reads on a background thread, handing their results back to the UI.
+"""
+from kivy.clock import Clock
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from sqlite3 import connect
+from threading import Lock, RLock, local
+
+from comics_queries import Queries, STATEMENT_CACHE_SIZE, register_functions
+
+# pragmas set on every connection, in this order
+PRAGMAS = (
+    # readers and the writer don't block each other, commits append to the log instead of rewriting pages
+    ('journal_mode', 'WAL'),
+    # in WAL mode, only checkpoints wait for the disk. A power cut may lose the last commits, never consistency
+    ('synchronous', 'NORMAL'),
+    # page cache of 16MB (negative values are KiB), per connection
+    ('cache_size', -16000),
+    # read up to 256MB of the database through memory mapping instead of read calls
+    ('mmap_size', 256 * 1024 * 1024),
+    # temporary tables and indices, eg. of ORDER BY without an index, stay in memory
+    ('temp_store', 'MEMORY'),
+)
+
+
+def open_connection(db_path, read_only=False):
+    """ Return connection to db_path with PRAGMAS set and the app's functions registered
+
+        Connections may be closed by another thread than the one using them, the manager takes care that no
+        connection is used by two threads at the same time.
+    """
+    conn = connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    for pragma, value in PRAGMAS:
+        conn.execute("PRAGMA {} = {}".format(pragma, value))
+    if read_only:
+        conn.execute("PRAGMA query_only = 1")
+    register_functions(conn)
+    return conn
+
+
+class ConnectionManager(object):
+    """ The writer connection of a database, and a read only connection for every thread reading from it
+
+        Readers need a database file, an in memory database is only visible to the writer.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.writer = open_connection(db_path)
+        self.writer_queries = Queries(self.writer)
+        # held by the thread writing, for the whole transaction
+        self.write_lock = RLock()
+        # functions to call once the current transaction is committed, None outside of writing()
+        self.commit_hooks = None
+
+        # read queries of the current thread, and the queries of every read connection opened
+        self.local = local()
+        self.readers = []
+        self.readers_lock = Lock()
+
+    def reader(self):
+        """ Return read only queries of the current thread, opening its connection on first use """
+        queries = getattr(self.local, 'queries', None)
+        if queries is None:
+            conn = open_connection(self.db_path, read_only=True)
+            queries = self.local.queries = Queries(conn)
+            with self.readers_lock:
+                self.readers.append(queries)
+        return queries
+
+    @contextmanager
+    def writing(self):
+        """ Hold the writer for one transaction, committing it at the end or rolling it back on any exception
+
+            Yields the writer's queries. Writes of other threads wait until the transaction is over.
+        """
+        with self.write_lock:
+            self.commit_hooks = []
+            try:
+                yield self.writer_queries
+            except BaseException:
+                self.writer.rollback()
+                raise
+            else:
+                self.writer.commit()
+                for hook in self.commit_hooks:
+                    hook()
+            finally:
+                self.commit_hooks = None
+
+    @contextmanager
+    def savepoint(self, name):
+        """ Undo only what was written inside this block if it raises an exception, within a transaction of writing()
+
+            The exception is raised again, the rest of the transaction is kept and can go on.
+        """
+        hooks = len(self.commit_hooks)
+        # releasing the outermost savepoint would commit, so the transaction has to be open already
+        if not self.writer.in_transaction:
+            self.writer.execute("BEGIN")
+        self.writer.execute("SAVEPOINT '{}'".format(name))
+        try:
+            yield self.writer_queries
+        except BaseException:
+            self.writer.execute("ROLLBACK TO '{}'".format(name))
+            self.writer.execute("RELEASE '{}'".format(name))
+            # whatever was rolled back won't need to be announced
+            del self.commit_hooks[hooks:]
+            raise
+        else:
+            self.writer.execute("RELEASE '{}'".format(name))
+
+    def after_commit(self, hook):
+        """ Call hook once the current transaction is committed, not at all if it's rolled back
+
+            Outside of writing(), eg. while creating the database, hook is called right away.
+        """
+        if self.commit_hooks is None:
+            hook()
+        else:
+            self.commit_hooks.append(hook)
+
+    def print_execution_counts(self):
+        """ Print how many times each statement was executed, on any connection """
+        total = Queries(None)
+        with self.readers_lock:
+            for queries in [self.writer_queries] + self.readers:
+                total.execution_counts.update(queries.execution_counts)
+        total.print_execution_counts()
+
+    def close(self):
+        """ Close every connection, eg. when the app stops """
+        with self.readers_lock:
+            for queries in self.readers:
+                queries.conn.close()
+            self.readers.clear()
+        with self.write_lock:
+            self.writer.close()
+
+
+class DatabaseExecutor(object):
+    """ Run database jobs one after another on a background thread, so neither commits nor slow queries stall the UI
+
+        A job is a function called with the queries it runs on, followed by its arguments. Write jobs run in one
+        transaction of the writer, read jobs on the read connection of the executor's thread. Jobs are submitted
+        from the main thread, where their callbacks get called too.
+    """
+
+    def __init__(self, database, on_pending=None):
+        self.database = database
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        # number of jobs submitted and not resolved yet, on_pending(pending) is called whenever it changes
+        self.pending = 0
+        self.on_pending = on_pending
+
+    def read(self, job, *args, callback=None, error_callback=None):
+        """ Run job on a read connection, see submit """
+        return self.submit(job, args, False, callback, error_callback)
+
+    def write(self, job, *args, callback=None, error_callback=None):
+        """ Run job in a transaction of the writer, which gets rolled back if job raises an exception, see submit """
+        return self.submit(job, args, True, callback, error_callback)
+
+    def submit(self, job, args, write, callback, error_callback):
+        """ Queue job and return its future
+
+            Once the job is done, callback(result) or, if it raised an exception, error_callback(exception) is called
+            on the main thread.
+        """
+        self.set_pending(self.pending + 1)
+        future = self.executor.submit(self.run, job, args, write)
+        future.add_done_callback(lambda f: Clock.schedule_once(lambda dt: self.resolve(job, f, callback, error_callback)))
+        return future
+
+    def run(self, job, args, write):
+        """ Run job on the executor's thread """
+        if write:
+            with self.database.writing() as queries:
+                return job(queries, *args)
+        return job(self.database.reader(), *args)
+
+    def resolve(self, job, future, callback, error_callback):
+        """ Pass the result of a finished job to its callback, on the main thread """
+        self.set_pending(self.pending - 1)
+        error = future.exception()
+        if error is None:
+            if callback:
+                callback(future.result())
+        elif error_callback:
+            error_callback(error)
+        else:
+            print("Database job {} failed: {!r}".format(job.__name__, error))
+
+    def set_pending(self, pending):
+        self.pending = pending
+        if self.on_pending:
+            self.on_pending(pending)
+
+    def shutdown(self):
+        """ Wait for queued jobs to finish, eg. titles still being written, and stop the thread """
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,46 @@
+class GroupChains(object):
+    """ Look up groups and resolve their ancestor and descendant chains, one query each
+
+        Results are cached until invalidate() is called, which has to happen whenever a group is added.
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+        # group rows (id, name, parent) by (name, nocase), None if there is no such group
+        self.names = {}
+        # ancestor chains, root first, and subtrees of group ids
+        self.chains = {}
+        self.subtrees = {}
+
+    def find(self, name, nocase=False):
+        """ Return (id, name, parent) of group called name, None if it doesn't exist """
+        key = (name, nocase)
+        if key not in self.names:
+            statement = 'group_by_name_nocase' if nocase else 'group_by_name'
+            self.names[key] = self.queries.execute(statement, (name,)).fetchone()
+        return self.names[key]
+
+    def chain(self, group_id):
+        """ Return tuple of (id, name, parent) from the root group down to group_id """
+        if group_id not in self.chains:
+            chain = self.chains[group_id] = tuple(self.queries.execute('group_ancestors', (group_id,)))
+            # groups of the chain can be found by name without another query
+            for group in chain:
+                self.names[(group[1], False)] = group
+        return self.chains[group_id]
+
+    def chain_names(self, group_id):
+        """ Return list of group names from the root group down to group_id """
+        return [g[1] for g in self.chain(group_id)]
+
+    def descendants(self, group_id):
+        """ Return tuple of (id, name, parent, depth) of group_id and every group below it """
+        if group_id not in self.subtrees:
+            self.subtrees[group_id] = tuple(self.queries.execute('group_descendants', (group_id,)))
+        return self.subtrees[group_id]
+
+    def invalidate(self):
+        """ Forget all cached groups and chains """
+        self.names.clear()
+        self.chains.clear()
+        self.subtrees.clear()
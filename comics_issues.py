@@ -0,0 +1,303 @@
+from functools import total_ordering
+from json import dumps, loads
+from re import compile
+
+# run of consecutive standard issues in encoded owned issues, eg. 1-36
+ISSUE_RUN = compile(r'^(\d+)-(\d+)$')
+
+
+@total_ordering
+class IssueNumber(object):
+    """ Parsed issue number, like 5, -1, 1.5, 1a, 2_ or 2_b
+
+        Instances are immutable and interned, use IssueNumber.parse(text) to get the (cached) instance for a text.
+        Issues sort by number first, then plain numbers before letter suffixes before '_' variants, eg.
+        -1 < 0 < 1 < 1a < 1_ < 1_a < 1.5 < 2
+    """
+
+    __slots__ = ('text', 'value', 'number', 'tail', 'key')
+
+    INT = compile(r'^((-?[1-9]\d{0,3})|0)$')
+    FLOAT = compile(r'^-?\d{1,4}\.\d{1,2}$')
+    STRING = compile(r'^-?\d{1,4}((\D{1,2})|((\.\d{1,2})?_((\D|\d){1,2})?))$')
+    # numeric part and anything after it, eg. '1.5' and '_a' of '1.5_a'
+    PARTS = compile(r'^(-?\d{1,4}(?:\.\d{1,2})?)(.*)$')
+
+    # parsed issue numbers (None for invalid text) by text
+    cache = {}
+
+    def __init__(self, text):
+        if self.INT.match(text):
+            value = number = int(text)
+            tail = ''
+        elif self.FLOAT.match(text):
+            value = number = float(text)
+            tail = ''
+        elif self.STRING.match(text):
+            value = text
+            number, tail = self.PARTS.match(text).groups()
+            number = float(number) if '.' in number else int(number)
+        else:
+            raise ValueError("{} is not a valid issue number".format(text))
+
+        rank = 0 if not tail else 2 if tail.startswith('_') else 1
+        for name, v in (('text', text), ('value', value), ('number', number), ('tail', tail),
+                        ('key', (number, rank, tail))):
+            object.__setattr__(self, name, v)
+
+    @classmethod
+    def parse(cls, text):
+        """ Return interned IssueNumber for text, None if text isn't a valid issue number """
+        text = text.strip()
+        try:
+            return cls.cache[text]
+        except KeyError:
+            try:
+                issue = cls(text)
+            except ValueError:
+                issue = None
+            cls.cache[text] = issue
+            return issue
+
+    def __setattr__(self, name, value):
+        raise AttributeError("IssueNumber is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, IssueNumber):
+            return NotImplemented
+        return self.key == other.key
+
+    def __lt__(self, other):
+        if not isinstance(other, IssueNumber):
+            return NotImplemented
+        return self.key < other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "IssueNumber('{}')".format(self.text)
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def is_number(self):
+        """ Return whether issue is a plain int or float """
+        return not self.tail
+
+    @property
+    def is_variant(self):
+        """ Return whether issue is a variant of another issue, eg. 2_ or 2_b """
+        return self.tail.startswith('_')
+
+    def in_range(self, issues):
+        """ Return whether the issue's number is one of a range of standard issues, in O(1) """
+        return self.number == int(self.number) and int(self.number) in issues
+
+
+def parse_issue(text):
+    """ Return issue number text as int, float or str """
+    issue = IssueNumber.parse(text)
+    return issue.value if issue else text
+
+
+def convert_issue_number(text):
+    """ Return issue number text, as entered or shown on an issue, as int, float or str, None if it isn't valid """
+
+    # ints, fractions, or strings like 1a, 1_, 1_a, 1_ab, 1_a1, etc
+    issue = IssueNumber.parse(text)
+    if issue is None:
+        print("no match: {}".format(text.strip()))
+        return None
+    return issue.value
+
+
+class OwnedIssues(object):
+    """ Set of owned issues
+
+        Standard issues (whole numbers above 0) are bits of a bitmap, any other issue, like 0, -1, 1.5, 1a or 2_b,
+        goes into a side set. Membership is O(1) for both, and the number of owned issues is kept up to date.
+    """
+
+    __slots__ = ('bitmap', 'count', 'odd')
+
+    def __init__(self, issues=()):
+        self.bitmap = bytearray()
+        # number of bits set in bitmap
+        self.count = 0
+        self.odd = set()
+        for issue in issues:
+            self.add(issue)
+
+    @staticmethod
+    def is_standard(issue):
+        """ Return whether issue is stored in the bitmap """
+        return type(issue) is int and issue > 0
+
+    def __contains__(self, issue):
+        if self.is_standard(issue):
+            byte = issue >> 3
+            return byte < len(self.bitmap) and bool(self.bitmap[byte] >> (issue & 7) & 1)
+        return issue in self.odd
+
+    def __len__(self):
+        return self.count + len(self.odd)
+
+    def __iter__(self):
+        """ Iterate over standard issues in ascending order, followed by odd issues """
+        for byte, bits in enumerate(self.bitmap):
+            if bits:
+                for bit in range(8):
+                    if bits >> bit & 1:
+                        yield byte << 3 | bit
+        yield from self.odd
+
+    def __eq__(self, other):
+        return isinstance(other, OwnedIssues) and self.encode() == other.encode()
+
+    def __repr__(self):
+        return "OwnedIssues('{}')".format(self.encode())
+
+    def add(self, issue):
+        """ Add issue to owned issues """
+        if self.is_standard(issue):
+            byte, mask = issue >> 3, 1 << (issue & 7)
+            if byte >= len(self.bitmap):
+                self.bitmap.extend(bytes(byte + 1 - len(self.bitmap)))
+            if not self.bitmap[byte] & mask:
+                self.bitmap[byte] |= mask
+                self.count += 1
+        else:
+            self.odd.add(issue)
+
+    def discard(self, issue):
+        """ Remove issue from owned issues, if it is owned """
+        if self.is_standard(issue):
+            if issue in self:
+                self.bitmap[issue >> 3] &= ~(1 << (issue & 7))
+                self.count -= 1
+        else:
+            self.odd.discard(issue)
+
+    def update(self, issues):
+        """ Add all issues, in a single pass """
+        for issue in issues:
+            self.add(issue)
+
+    def difference_update(self, issues):
+        """ Remove all issues that are owned, in a single pass """
+        for issue in issues:
+            self.discard(issue)
+
+    def remove(self, issue):
+        """ Remove issue from owned issues, raising KeyError if it isn't owned """
+        if issue not in self:
+            raise KeyError(issue)
+        self.discard(issue)
+
+    def runs(self):
+        """ Yield (first, last) of every run of consecutive standard issues """
+        first = last = None
+        for issue in self:
+            if not self.is_standard(issue):
+                break
+            if last is not None and issue == last + 1:
+                last = issue
+                continue
+            if first is not None:
+                yield first, last
+            first = last = issue
+        if first is not None:
+            yield first, last
+
+    def encode(self):
+        """ Return compact text of owned issues, eg. '1-36,40,42-50,1a,2_b' """
+        runs = [str(first) if first == last else '{}-{}'.format(first, last) for first, last in self.runs()]
+        return ','.join(runs + sorted(str(i) for i in self.odd))
+
+    @classmethod
+    def decode(cls, text):
+        """ Return OwnedIssues from encoded text """
+        owned = cls()
+        for token in text.split(','):
+            run = ISSUE_RUN.match(token)
+            if run:
+                for issue in range(int(run.group(1)), int(run.group(2)) + 1):
+                    owned.add(issue)
+            elif token:
+                owned.add(parse_issue(token))
+        return owned
+
+
+def decode_owned_issues(value):
+    """ Return owned issues as stored in the database, leaving 'complete' as is
+
+        Besides the encoded format, this reads the JSON lists owned issues used to be stored as.
+    """
+    if value == 'complete':
+        return value
+    elif not value:
+        return OwnedIssues()
+    elif isinstance(value, list):
+        return OwnedIssues(value)
+    elif value.startswith('['):
+        return OwnedIssues(loads(value))
+    return OwnedIssues.decode(value)
+
+
+def encode_owned_issues(value):
+    """ Return database value of owned issues in any format, NULL if none are owned """
+    owned = decode_owned_issues(value)
+    if owned == 'complete':
+        return owned
+    return owned.encode() or None
+
+
+def encode_other_editions(value):
+    """ Return database value of other editions, with owned issues of every edition encoded like json_default does
+
+        Editions used to hold their owned issues as JSON lists, those are re-encoded, anything else is kept as is.
+    """
+    if not value:
+        return value
+    editions = loads(value)
+    for edition in editions.values():
+        if isinstance(edition, dict) and isinstance(edition.get('owned_issues'), list):
+            edition['owned_issues'] = OwnedIssues(edition['owned_issues']).encode()
+    return dumps(editions)
+
+
+def count_total_issues(standard_issues, odd_issues):
+    """ Return number of issues in a title, from the database values of its standard and odd issues """
+
+    if isinstance(standard_issues, str):
+        if standard_issues.endswith('+'):
+            # ongoing series
+            total = int(standard_issues[:-1])
+        elif '-' in standard_issues:
+            # range, like 25-100
+            first, last = standard_issues.split('-')
+            total = int(last) - int(first) + 1
+        else:
+            total = int(standard_issues)
+    else:
+        total = standard_issues or 0
+    if odd_issues:
+        total += len(loads(odd_issues))
+    return total
+
+
+def count_owned_issues(owned_issues, standard_issues, odd_issues):
+    """ Return number of owned issues in a title, from its database values """
+    owned = decode_owned_issues(owned_issues)
+    if owned == 'complete':
+        return count_total_issues(standard_issues, odd_issues)
+    return len(owned)
+
+
+def json_default(obj):
+    """ Let json.dumps encode owned issues nested in other data, eg. other editions """
+    if isinstance(obj, OwnedIssues):
+        return obj.encode()
+    raise TypeError("{} is not JSON serializable".format(type(obj).__name__))
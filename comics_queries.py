@@ -0,0 +1,163 @@
+from collections import Counter
+from json import dumps
+
+from comics_collation import KEY_END, register_collation
+from comics_issues import OwnedIssues, count_owned_issues, count_total_issues, json_default
+
+# number of compiled statements sqlite3 keeps per connection, enough to hold every statement below
+STATEMENT_CACHE_SIZE = 64
+
+# fields of TITLES that get written when a title is submitted
+TITLE_FIELDS = ('publisher_id', 'title', 'volume', 'format', 'standard_issues', 'odd_issues', 'owned_issues',
+                'other_editions', 'start_date', 'end_date', 'grouping', 'notes', 'issue_notes')
+
+# all titles with their publisher, or comma separated publishers for inter company cross overs
+TITLES_SELECT = """SELECT TITLES.*, PUBLISHERS.publisher,
+                          (SELECT group_concat(p.publisher, ', ')
+                           FROM TITLE_PUBLISHERS AS tp JOIN PUBLISHERS AS p ON p.id = tp.publisher_id
+                           WHERE tp.title_id = TITLES.id) AS publishers
+                   FROM TITLES LEFT JOIN PUBLISHERS ON PUBLISHERS.id = TITLES.publisher_id"""
+
+# next page of titles in sort key order, seeking past the (sort_key, id) of the previous page's last title on the
+# sort key index, and stopping at the first sort key not starting with the filtered prefix
+TITLES_PAGE = TITLES_SELECT + """ WHERE (TITLES.sort_key, TITLES.id) > (?, ?) AND TITLES.sort_key < ?
+                                  ORDER BY TITLES.sort_key, TITLES.id LIMIT ?"""
+
+# a group and all its ancestors, root group first
+GROUP_ANCESTORS = """WITH RECURSIVE chain(id, name, parent, depth) AS (
+                         SELECT id, name, parent, 0 FROM GROUPS WHERE id = ?
+                         UNION ALL
+                         SELECT g.id, g.name, g.parent, chain.depth + 1
+                         FROM GROUPS AS g JOIN chain ON g.id = chain.parent)
+                     SELECT id, name, parent FROM chain ORDER BY depth DESC"""
+
+# a group and every group below it, with their depth below the group
+GROUP_DESCENDANTS = """WITH RECURSIVE tree(id, name, parent, depth) AS (
+                           SELECT id, name, parent, 0 FROM GROUPS WHERE id = ?
+                           UNION ALL
+                           SELECT g.id, g.name, g.parent, tree.depth + 1
+                           FROM GROUPS AS g JOIN tree ON g.parent = tree.id)
+                       SELECT id, name, parent, depth FROM tree"""
+
+# child groups of a group (top level groups for NULL), each with title and issue counts of its whole subtree
+GROUP_CHILDREN_COUNTS = """WITH RECURSIVE subtree(root, id) AS (
+                               SELECT id, id FROM GROUPS WHERE parent IS ?
+                               UNION ALL
+                               SELECT subtree.root, g.id FROM GROUPS AS g JOIN subtree ON g.parent = subtree.id)
+                           SELECT c.id, c.name, EXISTS (SELECT 1 FROM GROUPS WHERE parent = c.id) AS has_children,
+                                  count(t.id) AS titles,
+                                  ifnull(sum(count_owned_issues(t.owned_issues, t.standard_issues, t.odd_issues)), 0),
+                                  ifnull(sum(count_total_issues(t.standard_issues, t.odd_issues)), 0)
+                           FROM subtree JOIN GROUPS AS c ON c.id = subtree.root
+                           -- grouping is a TEXT column, comparing it to text lets the lookup use its index
+                           LEFT JOIN TITLES AS t ON t.grouping = CAST(subtree.id AS TEXT)
+                           GROUP BY c.id ORDER BY c.name COLLATE TITLE"""
+
+# best matching titles with matched words enclosed by char(1) and char(2), weighing title matches highest
+SEARCH_TITLES = """SELECT rowid, highlight(TITLES_SEARCH, 0, char(1), char(2)), volume,
+                          snippet(TITLES_SEARCH, -1, char(1), char(2), '...', 10)
+                   FROM TITLES_SEARCH WHERE TITLES_SEARCH MATCH ?
+                   ORDER BY bm25(TITLES_SEARCH, 10.0, 2.0, 4.0, 1.0, 1.0) LIMIT ?"""
+
+# named, parameterised statements. sqlite3 compiles each of these once per connection and reuses it afterwards
+STATEMENTS = {
+    # publishers
+    'publisher_id': "SELECT id FROM PUBLISHERS WHERE publisher IS ?",
+    'insert_publisher': "INSERT INTO PUBLISHERS ('publisher') VALUES (?)",
+    'publisher_names': "SELECT publisher FROM PUBLISHERS",
+
+    # formats
+    'format_id': "SELECT id FROM FORMATS WHERE format IS ?",
+    'insert_format': "INSERT INTO FORMATS ('format') VALUES (?)",
+    'format_names': "SELECT format FROM FORMATS",
+
+    # groups
+    'group_by_id': "SELECT id, name, parent FROM GROUPS WHERE id = ?",
+    'group_by_name': "SELECT id, name, parent FROM GROUPS WHERE name = ?",
+    'group_by_name_nocase': "SELECT id, name, parent FROM GROUPS WHERE name = ? COLLATE NOCASE",
+    'insert_group': "INSERT INTO GROUPS (name, parent) VALUES (?, ?)",
+    'group_names': "SELECT name FROM GROUPS",
+    'group_ancestors': GROUP_ANCESTORS,
+    'group_descendants': GROUP_DESCENDANTS,
+    'group_children_counts': GROUP_CHILDREN_COUNTS,
+    'groups_count': "SELECT count(*) FROM GROUPS",
+
+    # titles
+    'insert_title': "INSERT INTO TITLES ({}) VALUES ({})".format(', '.join(TITLE_FIELDS),
+                                                                ', '.join(':' + f for f in TITLE_FIELDS)),
+    # titles of a bulk import, whose ids are assigned before inserting so cross overs can be linked in bulk too
+    'import_title': "INSERT INTO TITLES (id, {}) VALUES (:id, {})".format(', '.join(TITLE_FIELDS),
+                                                                      ', '.join(':' + f for f in TITLE_FIELDS)),
+    'titles_last_id': """SELECT max(ifnull((SELECT seq FROM sqlite_sequence WHERE name = 'TITLES'), 0),
+                                    ifnull(max(id), 0)) FROM TITLES""",
+    'insert_title_publisher': "INSERT INTO TITLE_PUBLISHERS ('title_id', 'publisher_id') VALUES (?, ?)",
+    'all_titles': TITLES_SELECT + " ORDER BY TITLES.sort_key, TITLES.id",
+    'titles_since': TITLES_SELECT + " WHERE TITLES.row_version > ?",
+    'titles_page': TITLES_PAGE,
+    'title_text': "SELECT title FROM TITLES WHERE id = ?",
+    'titles_version': "SELECT ifnull(max(row_version), 0) FROM TITLES",
+    'titles_count': "SELECT count(*) FROM TITLES",
+    'search_titles': SEARCH_TITLES,
+}
+
+
+def register_functions(conn):
+    """ Make the functions and collations used by statements and triggers available on connection """
+    conn.create_function('count_owned_issues', 3, count_owned_issues)
+    conn.create_function('count_total_issues', 2, count_total_issues)
+    register_collation(conn)
+
+
+class Queries(object):
+    """ Run named statements against a connection, keeping count of how often each one is executed """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.execution_counts = Counter()
+
+    def execute(self, name, parameters=(), db_cursor=None):
+        """ Execute named statement and return the cursor it ran on """
+        self.execution_counts[name] += 1
+        if db_cursor is None:
+            db_cursor = self.conn.cursor()
+        return db_cursor.execute(STATEMENTS[name], parameters)
+
+    def executemany(self, name, seq_of_parameters, db_cursor=None):
+        """ Execute named statement once for every set of parameters """
+        if db_cursor is None:
+            db_cursor = self.conn.cursor()
+        db_cursor.executemany(STATEMENTS[name], seq_of_parameters)
+        self.execution_counts[name] += max(db_cursor.rowcount, 0)
+        return db_cursor
+
+    def titles_page(self, prefix='', after=None, limit=100):
+        """ Return cursor over a page of titles whose sort keys start with prefix, in sort key order
+
+            after is (sort_key, id) of the previous page's last title, None for the first page. Every page is a
+            range scan of the sort key index, costing the same however far into the titles it starts.
+        """
+        after_key, after_id = after or (prefix, 0)
+        return self.execute('titles_page', (after_key, after_id, prefix + KEY_END, limit))
+
+    def print_execution_counts(self):
+        """ Print how many times each statement was executed """
+        for name, count in self.execution_counts.most_common():
+            print("{:<25}{}".format(name, count))
+
+    @staticmethod
+    def title_parameters(dictionary):
+        """ Return named parameters for insert_title from data dictionary """
+
+        parameters = {}
+        for field in TITLE_FIELDS:
+            v = dictionary.get(field)
+            # set NULL if v empty
+            if not v or v == 'None':
+                v = None
+            # encode owned issues, jsonify lists and dicts
+            elif isinstance(v, OwnedIssues):
+                v = v.encode()
+            elif isinstance(v, list) or isinstance(v, dict):
+                v = dumps(v, default=json_default)
+            parameters[field] = v
+        return parameters
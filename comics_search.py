@@ -0,0 +1,116 @@
+""" Full text search over titles, volumes, publishers, title notes and issue notes
+
+    TITLES_SEARCH is an FTS5 table with one row per title (rowid = TITLES.id), kept in sync by triggers.
+    Rebuild the index of an existing database with: python comics_search.py --rebuild [database path]
+    Search from the command line with: python comics_search.py [--db database path] words ...
+"""
+from argparse import ArgumentParser
+from re import findall
+from sqlite3 import connect
+from time import perf_counter
+
+from comics_queries import Queries
+
+# columns of TITLES_SEARCH, in the order their weights are given to bm25
+SEARCH_COLUMNS = ('title', 'volume', 'publishers', 'notes', 'issue_notes')
+
+# characters marking the start and end of matched words in highlights and snippets
+HIGHLIGHT_START = '\x01'
+HIGHLIGHT_END = '\x02'
+
+
+def publishers_value(title_id, publisher_id):
+    """ Return SQL expression of a title's publisher, or of all publishers of an inter company cross over """
+    return """ifnull((SELECT publisher FROM PUBLISHERS WHERE id = {1}),
+                     (SELECT group_concat(p.publisher, ' ')
+                      FROM TITLE_PUBLISHERS AS tp JOIN PUBLISHERS AS p ON p.id = tp.publisher_id
+                      WHERE tp.title_id = {0}))""".format(title_id, publisher_id)
+
+
+def search_values(title):
+    """ Return SQL expressions of every search column, for the TITLES row named title, eg. 'new' in triggers """
+    return (
+        "{}.title".format(title),
+        "{}.volume".format(title),
+        publishers_value('{}.id'.format(title), '{}.publisher_id'.format(title)),
+        "{}.notes".format(title),
+        # every issue note on a line of its own, eg. '#5 signed copy'
+        """CASE WHEN json_valid({0}.issue_notes)
+                THEN (SELECT group_concat('#' || key || ' ' || value, char(10)) FROM json_each({0}.issue_notes))
+           END""".format(title),
+    )
+
+
+def create_search_index(db_cursor):
+    """ Create TITLES_SEARCH and the triggers that keep it in sync with TITLES and TITLE_PUBLISHERS """
+
+    columns = ', '.join(SEARCH_COLUMNS)
+    db_cursor.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS 'TITLES_SEARCH' USING fts5(
+                      {}, tokenize = 'unicode61', prefix = '2 3')""".format(columns))
+
+    insert = "INSERT INTO TITLES_SEARCH (rowid, {}) VALUES (new.id, {})".format(columns, ', '.join(search_values('new')))
+    update = "UPDATE TITLES_SEARCH SET {} WHERE rowid = new.id".format(
+             ', '.join('{} = {}'.format(c, v) for c, v in zip(SEARCH_COLUMNS, search_values('new'))))
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS 'titles_search_insert' AFTER INSERT ON TITLES
+                      BEGIN {}; END""".format(insert))
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS 'titles_search_update'
+                      AFTER UPDATE OF title, volume, publisher_id, notes, issue_notes ON TITLES
+                      BEGIN {}; END""".format(update))
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS 'titles_search_delete' AFTER DELETE ON TITLES
+                      BEGIN DELETE FROM TITLES_SEARCH WHERE rowid = old.id; END""")
+    # cross overs get linked to their publishers after the title was inserted
+    db_cursor.execute("""CREATE TRIGGER IF NOT EXISTS 'title_publishers_search_insert' AFTER INSERT ON TITLE_PUBLISHERS
+                      BEGIN UPDATE TITLES_SEARCH SET publishers = {} WHERE rowid = new.title_id; END""".format(
+                      publishers_value('new.title_id', '(SELECT publisher_id FROM TITLES WHERE id = new.title_id)')))
+    print("TITLES_SEARCH table created")
+
+
+def rebuild_search_index(db_cursor):
+    """ Index every title again, eg. for databases whose titles were added before the search index existed """
+
+    db_cursor.execute("DELETE FROM TITLES_SEARCH")
+    db_cursor.execute("INSERT INTO TITLES_SEARCH (rowid, {}) SELECT TITLES.id, {} FROM TITLES".format(
+                      ', '.join(SEARCH_COLUMNS), ', '.join(search_values('TITLES'))))
+    print("{} titles indexed".format(db_cursor.rowcount))
+
+
+def match_expression(text):
+    """ Return FTS5 query matching titles that contain words starting with every word of text, None if no words """
+    words = findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join('"{}"*'.format(w) for w in words)
+
+
+def search_titles(queries, text, limit=50):
+    """ Return (id, highlighted title, volume, snippet) of the best matching titles, best match first
+
+        Matched words are enclosed by HIGHLIGHT_START and HIGHLIGHT_END.
+    """
+    expression = match_expression(text)
+    if expression is None:
+        return []
+    return queries.execute('search_titles', (expression, limit)).fetchall()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Search titles, or rebuild the search index")
+    parser.add_argument('words', nargs='*', help="words to search for")
+    parser.add_argument('--db', default='database/ComicsDatabase.db', help="database path")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the search index")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    cur = conn.cursor()
+    if args.rebuild:
+        rebuild_search_index(cur)
+        conn.commit()
+    if args.words:
+        start = perf_counter()
+        results = search_titles(Queries(conn), ' '.join(args.words))
+        took = perf_counter() - start
+        for title_id, title, volume, snippet in results:
+            print(title_id, title.replace(HIGHLIGHT_START, '*').replace(HIGHLIGHT_END, '*'), volume or '',
+                  '| ' + snippet.replace(HIGHLIGHT_START, '*').replace(HIGHLIGHT_END, '*').replace('\n', ' '))
+        print("{} results in {:.2f}ms".format(len(results), 1000 * took))
+    conn.close()
@@ -0,0 +1,130 @@
+from kivy.clock import Clock
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+# key under which a trie node stores the best completion of its prefix, can't clash with a single character
+BEST = ''
+
+
+class SuggestionIndex(object):
+    """ Case insensitive prefix trie, every node holding the longest word starting with its prefix """
+
+    def __init__(self, words=()):
+        self.root = {}
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        """ Add word, updating the best completion of every prefix along its path """
+
+        node = self.root
+        self.set_best(node, word)
+        for c in word.lower():
+            node = node.setdefault(c, {})
+            self.set_best(node, word)
+
+    @staticmethod
+    def set_best(node, word):
+        """ Keep the longest word, a later word of the same length replaces an earlier one """
+        if len(word) >= len(node.get(BEST, '')):
+            node[BEST] = word
+
+    def suggest(self, prefix):
+        """ Return longest word starting with prefix, None if there isn't any """
+
+        node = self.root
+        for c in prefix.lower():
+            node = node.get(c)
+            if node is None:
+                return None
+        return node.get(BEST)
+
+
+class SuggestionService(object):
+    """ Debounce suggestion requests and look them up off the main thread, applying only the latest result
+
+        Every requesting widget (owner) has at most one pending request, a newer request replaces an older one.
+    """
+
+    def __init__(self, indices, delay=.1):
+        # suggestion index for each field, eg. 'publisher'
+        self.indices = indices
+        # seconds to wait for more typing before looking anything up
+        self.delay = delay
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        # scheduled (debounced) request and id of the latest request of each owner
+        self.pending = {}
+        self.latest = {}
+
+        # counters
+        self.requests = 0
+        self.debounced = 0
+        self.stale = 0
+        self.hits = 0
+        self.misses = 0
+        self.total_latency = 0
+        self.max_latency = 0
+
+    def add(self, field, word):
+        """ Add a new word to field's index """
+        self.indices[field].add(word)
+
+    def request(self, owner, field, text, callback):
+        """ Look up suggestion for text once owner stops typing, calling callback(result) on the main thread """
+
+        self.requests += 1
+        self.cancel(owner)
+        request_id = self.latest[owner] = self.requests
+        self.pending[owner] = Clock.schedule_once(
+            lambda dt: self.submit(owner, request_id, field, text, callback, perf_counter()), self.delay)
+
+    def cancel(self, owner):
+        """ Drop owner's pending request, any result still being looked up will be ignored """
+
+        event = self.pending.pop(owner, None)
+        if event:
+            event.cancel()
+            self.debounced += 1
+        self.latest[owner] = None
+
+    def submit(self, owner, request_id, field, text, callback, started):
+        """ Hand debounced request to the worker thread """
+        self.pending.pop(owner, None)
+        self.executor.submit(self.lookup, owner, request_id, field, text, callback, started)
+
+    def lookup(self, owner, request_id, field, text, callback, started):
+        """ Find suggestion on the worker thread and schedule applying it on the main thread """
+        result = self.indices[field].suggest(text)
+        Clock.schedule_once(lambda dt: self.apply(owner, request_id, result, callback, started))
+
+    def apply(self, owner, request_id, result, callback, started):
+        """ Pass result to callback, unless owner has made a newer request in the meantime """
+
+        if self.latest.get(owner) != request_id:
+            self.stale += 1
+            return
+
+        latency = perf_counter() - started
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+        callback(result)
+
+    def print_stats(self):
+        """ Print request counters and lookup latency """
+
+        answered = self.hits + self.misses
+        print("suggestions: {} requests, {} debounced, {} stale, {} hits, {} misses".format(
+              self.requests, self.debounced, self.stale, self.hits, self.misses))
+        if answered:
+            print("suggestion latency: {:.2f}ms mean, {:.2f}ms max".format(
+                  1000 * self.total_latency / answered, 1000 * self.max_latency))
+
+    def shutdown(self):
+        """ Stop worker thread """
+        self.executor.shutdown(wait=False)
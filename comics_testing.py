@@ -1,4 +1,26 @@
 import unittest
+from json import loads
+from os.path import join
+from sqlite3 import OperationalError, connect
+from tempfile import TemporaryDirectory
+from threading import Thread
+from types import SimpleNamespace
+
+from kivy.clock import Clock
+
+from comics_collation import COLLATION, Collation, title_sort_key
+from comics_database import ConnectionManager, DatabaseExecutor
+from comics_groups import GroupChains
+from comics_issues import IssueNumber, OwnedIssues, convert_issue_number, count_owned_issues, count_total_issues, \
+                          decode_owned_issues, encode_other_editions
+from comics_queries import Queries, register_functions
+from comics_search import HIGHLIGHT_END, HIGHLIGHT_START, create_search_index, match_expression, search_titles
+from comics_suggestions import SuggestionIndex
+from comics_titles import TitleRow
+from comics_transfer import export_tables, import_titles, read_rows
+from comics_validation import collection_complete, excess_owned_issues, parse_standard_issues, split_odd_issues, \
+                              validate_date
+from main import ComicsApp
 from screen_home import ScreenHome
 
 
@@ -14,10 +36,446 @@ class TestSorting(unittest.TestCase):
         print(sorted_list)
         self.assertEqual(sorted_list, self.sorted_output)
 
+    def test_titles_page(self):
+
+        conn = connect(':memory:')
+        register_functions(conn)
+        conn.execute("CREATE TABLE PUBLISHERS (id INTEGER PRIMARY KEY, publisher TEXT)")
+        conn.execute("CREATE TABLE TITLE_PUBLISHERS (title_id INTEGER, publisher_id INTEGER)")
+        conn.execute("CREATE TABLE TITLES (id INTEGER PRIMARY KEY, publisher_id INTEGER, title TEXT, sort_key TEXT)")
+        conn.execute("CREATE INDEX titles_sort_key ON TITLES(sort_key)")
+        titles = ["The Amazing Spider-Man", "Batman", "Batman", "Batman", "batman beyond", "Spawn", "the Spectre"]
+        conn.executemany("INSERT INTO TITLES (title, sort_key) VALUES (?, title_sort_key(?))", [(t, t) for t in titles])
+        queries = Queries(conn)
+
+        def pages(prefix):
+            """ Return ids of every page of titles starting with prefix, two titles per page """
+            result, after = [], None
+            while True:
+                page = queries.titles_page(prefix, after, 2).fetchall()
+                result.append([t[0] for t in page])
+                if len(page) < 2:
+                    return result
+                after = (page[-1][3], page[-1][0])
+
+        # titles with the same sort key continue on the next page by id
+        self.assertEqual(pages(''), [[1, 2], [3, 4], [5, 6], [7]])
+        self.assertEqual(pages(COLLATION.prefix_key('bat')), [[2, 3], [4, 5], []])
+        self.assertEqual(pages(COLLATION.prefix_key('The Sp')), [[6, 7], []])
+        self.assertEqual(pages(COLLATION.prefix_key('x')), [[]])
+
+    def test_listed_at_page_end(self):
+
+        conn = connect(':memory:')
+        register_functions(conn)
+        conn.execute("CREATE TABLE PUBLISHERS (id INTEGER PRIMARY KEY, publisher TEXT)")
+        conn.execute("CREATE TABLE TITLE_PUBLISHERS (title_id INTEGER, publisher_id INTEGER)")
+        conn.execute("CREATE TABLE TITLES (id INTEGER PRIMARY KEY, publisher_id INTEGER, title TEXT, sort_key TEXT)")
+        conn.executemany("INSERT INTO TITLES (title, sort_key) VALUES (?, title_sort_key(?))",
+                         [(t, t) for t in ("Batman", "Batman", "Spawn", "Batman")])
+        queries = Queries(conn)
+
+        # the first page of two titles was listed, then another Batman was added
+        key = title_sort_key("Batman")
+        screen = SimpleNamespace(title_filter='', page_end=(key, 2))
+        self.assertTrue(ScreenHome.is_listed(screen, key, 1))
+        # sharing the last listed title's sort key, but with a higher id, it is left to the next page
+        self.assertFalse(ScreenHome.is_listed(screen, key, 4))
+        self.assertEqual([t[0] for t in queries.titles_page('', screen.page_end, 2)], [4, 3])
+
+    def test_update_titles(self):
+
+        class TitleList(object):
+            """ ScreenHome's list of titles, without its widgets """
+            title_sort_key = staticmethod(ScreenHome.title_sort_key)
+            list_key = ScreenHome.list_key
+            is_listed = ScreenHome.is_listed
+            update_titles = ScreenHome.update_titles
+            find_title_index = ScreenHome.find_title_index
+
+        titles = [{'id': 1, 'title': "Batman"}, {'id': 3, 'title': "Batman"}, {'id': 5, 'title': "Spawn"}]
+        screen = TitleList()
+        screen.title_filter, screen.page_end = '', None
+        screen.titles_container = SimpleNamespace(data=list(titles))
+        screen.title_keys = [screen.list_key(t) for t in titles]
+        screen.titles_by_id = {t['id']: t for t in titles}
+
+        # titles sharing a sort key are listed by id, like pages list them
+        screen.update_titles([{'id': 2, 'title': "Batman"}, {'id': 5, 'title': "The Batman"}])
+        self.assertEqual([t['id'] for t in screen.titles_container.data], [1, 2, 3, 5])
+        screen.update_titles([{'id': 1, 'title': "Batman", 'volume': '2'}])
+        self.assertEqual([t['id'] for t in screen.titles_container.data], [2, 3, 5, 1])
+        self.assertEqual(screen.title_keys, sorted(screen.title_keys))
+
+    def test_collation(self):
+
+        titles = ["Les Misérables", "Batman", "The Amazing Spider-Man", "batman", "Die Ärzte", "El Zorro", "L'Incal",
+                  "Élektra", "A", "Batman 10", "Batman 2"]
+        self.assertEqual(sorted(titles, key=title_sort_key),
+                         ["A", "The Amazing Spider-Man", "Die Ärzte", "Batman", "batman", "Batman 2", "Batman 10",
+                          "Élektra", "L'Incal", "Les Misérables", "El Zorro"])
+        # volumes of a title sort by number, before any longer title
+        self.assertLess(title_sort_key("Batman", '2'), title_sort_key("Batman", '10'))
+        self.assertLess(title_sort_key("Batman", '10'), title_sort_key("Batman Beyond"))
+        # articles of other languages are kept
+        self.assertEqual(Collation(('en',)).key("Die Hard"), "die hard")
+        # a number at the end of typed text may be incomplete
+        self.assertTrue(title_sort_key("Batman 10").startswith(COLLATION.prefix_key("the batman 1")))
+        # unless the text is a number only, which would list every title
+        self.assertTrue(title_sort_key("2000 AD").startswith(COLLATION.prefix_key("2000")))
+        self.assertTrue(title_sort_key("The 100").startswith(COLLATION.prefix_key("the 100")))
+        self.assertFalse(title_sort_key("Batman").startswith(COLLATION.prefix_key("100")))
+
+        conn = connect(':memory:')
+        register_functions(conn)
+        rows = conn.execute("SELECT column1 FROM (VALUES ('The Zoo'), ('b'), ('Élan'), ('Vol. 10'), ('Vol. 9')) "
+                            "ORDER BY column1 COLLATE TITLE").fetchall()
+        self.assertEqual([r[0] for r in rows], ['b', 'Élan', 'Vol. 9', 'Vol. 10', 'The Zoo'])
+
     def test_json_title_dict(self):
         l = [5, 'The Batman Adventures', None, None, 36, None, 'complete', '{"Annuals": {"owned_issues": [1, 2], "no_of_issues": 2}}', '10-1992', '10-1995', None, None]
         result = ScreenHome.json_loads_dict({"odd_issues": '["1a", 2]', "owned_issues": "[1,2,3]"})
         self.assertEqual(result, {'owned_issues': 'complete', 'odd_issues': ['1a', 2]})
 
+
+class TestSuggestionIndex(unittest.TestCase):
+
+    def test_suggest_longest_match(self):
+
+        index = SuggestionIndex(['DC', 'Dark Horse', 'Marvel'])
+        self.assertEqual(index.suggest('d'), 'Dark Horse')
+        self.assertEqual(index.suggest('DC'), 'DC')
+        self.assertIsNone(index.suggest('x'))
+
+        index.add('Marvel Knights')
+        self.assertEqual(index.suggest('mar'), 'Marvel Knights')
+
+
+class TestOwnedIssues(unittest.TestCase):
+
+    def test_encode_decode(self):
+
+        owned = OwnedIssues([1, 2, 3, 5, 7, 8, '1a', 0, -1.5])
+        self.assertEqual(owned.encode(), '1-3,5,7-8,-1.5,0,1a')
+        self.assertEqual(OwnedIssues.decode(owned.encode()), owned)
+        self.assertEqual(len(owned), 9)
+        self.assertIn(8, owned)
+        self.assertNotIn(4, owned)
+
+        owned.discard(8)
+        owned.discard(900)
+        self.assertEqual(len(owned), 8)
+        self.assertNotIn(8, owned)
+
+    def test_bulk_update(self):
+
+        owned = OwnedIssues([1, '1a'])
+        owned.update(range(1, 1001))
+        self.assertEqual(owned.encode(), '1-1000,1a')
+        owned.difference_update(range(500, 2000))
+        self.assertEqual(owned.encode(), '1-499,1a')
+        self.assertEqual(len(owned), 500)
+
+    def test_count_issues(self):
+
+        self.assertEqual(count_total_issues(10, '["1a", 0]'), 12)
+        self.assertEqual(count_total_issues('25-30', None), 6)
+        self.assertEqual(count_owned_issues('1-3,1a', '10+', None), 4)
+        self.assertEqual(count_owned_issues('complete', '10+', '["1a"]'), 11)
+
+    def test_decode_json_list(self):
+
+        self.assertEqual(decode_owned_issues('[1, 2, 3, "2_b"]'), OwnedIssues([1, 2, 3, '2_b']))
+        self.assertEqual(decode_owned_issues('complete'), 'complete')
+
+    def test_encode_other_editions(self):
+
+        editions = '{"TPB": {"owned_issues": [1, 2, 3, 5], "issues": "6"}, "Annuals": {"owned_issues": "1990"}}'
+        self.assertEqual(loads(encode_other_editions(editions)), {'TPB': {'owned_issues': '1-3,5', 'issues': '6'},
+                                                                  'Annuals': {'owned_issues': '1990'}})
+        self.assertIsNone(encode_other_editions(None))
+
+
+class TestIssueNumber(unittest.TestCase):
+
+    def test_parse(self):
+
+        self.assertEqual(IssueNumber.parse(' 5 ').value, 5)
+        self.assertEqual(IssueNumber.parse('1.5').value, 1.5)
+        self.assertEqual(IssueNumber.parse('2_b').value, '2_b')
+        self.assertIsNone(IssueNumber.parse('abc'))
+        self.assertIs(IssueNumber.parse('5'), IssueNumber.parse('5'))
+        self.assertEqual([convert_issue_number(i) for i in ('12', '-1', '1_a')], [12, -1, '1_a'])
+        self.assertIsNone(convert_issue_number('abc'))
+
+    def test_order(self):
+
+        issues = ['2', '1_a', '1a', '-1', '10', '1.5', '1_', '1', '0']
+        self.assertEqual([i.text for i in sorted(IssueNumber.parse(i) for i in issues)],
+                         ['-1', '0', '1', '1a', '1_', '1_a', '1.5', '2', '10'])
+
+
+class TestGroupChains(unittest.TestCase):
+
+    def setUp(self):
+        conn = connect(':memory:')
+        conn.execute("CREATE TABLE GROUPS (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, parent INTEGER)")
+        conn.executemany("INSERT INTO GROUPS VALUES (?, ?, ?)",
+                         [(1, 'Marvel Universe', None), (2, 'Spider-Man', 1), (3, 'Venom', 2), (4, 'X-Men', 1)])
+        self.queries = Queries(conn)
+        self.groups = GroupChains(self.queries)
+
+    def test_chain(self):
+
+        self.assertEqual(self.groups.chain_names(3), ['Marvel Universe', 'Spider-Man', 'Venom'])
+        self.assertEqual([g[0] for g in self.groups.descendants(2)], [2, 3])
+        self.assertEqual(self.groups.find('venom', nocase=True)[0], 3)
+
+        # cached until invalidated
+        self.groups.chain(3)
+        self.groups.find('Spider-Man')
+        self.assertEqual(self.queries.execution_counts['group_ancestors'], 1)
+        self.assertEqual(self.queries.execution_counts['group_by_name'], 0)
+        self.groups.invalidate()
+        self.groups.chain(3)
+        self.assertEqual(self.queries.execution_counts['group_ancestors'], 2)
+
+
+class TestSearch(unittest.TestCase):
+
+    def setUp(self):
+        conn = connect(':memory:')
+        conn.execute("CREATE TABLE PUBLISHERS (id INTEGER PRIMARY KEY, publisher TEXT)")
+        conn.execute("CREATE TABLE TITLE_PUBLISHERS (title_id INTEGER, publisher_id INTEGER)")
+        conn.execute("""CREATE TABLE TITLES (id INTEGER PRIMARY KEY, publisher_id INTEGER, title TEXT, volume INTEGER,
+                        notes TEXT, issue_notes TEXT)""")
+        conn.executemany("INSERT INTO PUBLISHERS VALUES (?, ?)", [(1, 'Marvel'), (2, 'DC')])
+        create_search_index(conn.cursor())
+        conn.execute("INSERT INTO TITLES VALUES (1, 1, 'Amazing Spider-Man', 2, 'great run', '{\"5\": \"signed\"}')")
+        conn.execute("INSERT INTO TITLES VALUES (2, NULL, 'Batman vs Spider-Man', NULL, NULL, NULL)")
+        conn.execute("INSERT INTO TITLES VALUES (3, 1, 'Venom', NULL, 'spider-man villain', NULL)")
+        conn.executemany("INSERT INTO TITLE_PUBLISHERS VALUES (?, ?)", [(2, 1), (2, 2)])
+        self.conn = conn
+        self.queries = Queries(conn)
+
+    def test_match_expression(self):
+
+        self.assertEqual(match_expression('spider man'), '"spider"* "man"*')
+        self.assertEqual(match_expression('"[]*'), None)
+
+    def test_search(self):
+
+        # title matches rank above matches in other columns
+        self.assertEqual([r[0] for r in search_titles(self.queries, 'spi')][2], 3)
+        self.assertEqual(search_titles(self.queries, 'amazing spi')[0][1],
+                         '{0}Amazing{1} {0}Spider{1}-Man'.format(HIGHLIGHT_START, HIGHLIGHT_END))
+        self.assertEqual([r[0] for r in search_titles(self.queries, 'signed')], [1])
+        # cross overs are found by all their publishers
+        self.assertEqual([r[0] for r in search_titles(self.queries, 'dc')], [2])
+
+        # triggers keep the index in sync
+        self.conn.execute("UPDATE TITLES SET notes = 'found in attic' WHERE id = 1")
+        self.assertEqual([r[0] for r in search_titles(self.queries, 'attic')], [1])
+        self.assertEqual(search_titles(self.queries, 'great'), [])
+        self.conn.execute("DELETE FROM TITLES WHERE id = 2")
+        self.assertEqual(search_titles(self.queries, 'batman'), [])
+
+
+class TestConnectionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.database = ConnectionManager(join(self.tmp.name, 'test.db'))
+        with self.database.writing() as queries:
+            queries.conn.execute("CREATE TABLE PUBLISHERS (id INTEGER PRIMARY KEY, publisher TEXT)")
+            queries.execute('insert_publisher', ('Marvel',))
+
+    def tearDown(self):
+        self.database.close()
+        self.tmp.cleanup()
+
+    def publishers(self):
+        """ Return publisher names as read by a thread of its own """
+        result = []
+        thread = Thread(target=lambda: result.extend(p[0] for p in self.database.reader().execute('publisher_names')))
+        thread.start()
+        thread.join()
+        return result
+
+    def test_read_while_writing(self):
+
+        self.assertEqual(self.database.writer.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        with self.database.writing() as queries:
+            queries.execute('insert_publisher', ('DC',))
+            # readers don't wait for the write, and only see committed publishers
+            self.assertEqual(self.publishers(), ['Marvel'])
+        self.assertEqual(self.publishers(), ['Marvel', 'DC'])
+        # every thread got a connection of its own
+        self.assertEqual(len(self.database.readers), 2)
+
+    def test_rollback(self):
+
+        with self.assertRaises(ValueError):
+            with self.database.writing() as queries:
+                queries.execute('insert_publisher', ('DC',))
+                raise ValueError
+        self.assertEqual(self.publishers(), ['Marvel'])
+        with self.assertRaises(OperationalError):
+            self.database.reader().execute('insert_publisher', ('DC',))
+
+    def test_savepoint(self):
+
+        committed = []
+        with self.database.writing() as queries:
+            with self.database.savepoint('dc'):
+                queries.execute('insert_publisher', ('DC',))
+                self.database.after_commit(lambda: committed.append('DC'))
+            with self.assertRaises(ValueError):
+                with self.database.savepoint('image'):
+                    queries.execute('insert_publisher', ('Image',))
+                    self.database.after_commit(lambda: committed.append('Image'))
+                    raise ValueError
+            # released savepoints are only committed with the whole transaction
+            self.assertEqual(self.publishers(), ['Marvel'])
+            self.assertEqual(committed, [])
+        self.assertEqual(self.publishers(), ['Marvel', 'DC'])
+        # hooks of rolled back savepoints are dropped
+        self.assertEqual(committed, ['DC'])
+
+    def test_executor(self):
+
+        results = []
+        jobs = DatabaseExecutor(self.database, on_pending=results.append)
+        insert = jobs.write(lambda queries, name: queries.execute('insert_publisher', (name,)).lastrowid, 'DC',
+                            callback=results.append)
+        fail = jobs.write(lambda queries: queries.execute('insert_publisher', ('Image',)) and 1 / 0,
+                          error_callback=lambda error: results.append(type(error)))
+        self.assertEqual(insert.result(), 2)
+        with self.assertRaises(ZeroDivisionError):
+            fail.result()
+        jobs.shutdown()
+        # callbacks run on the main thread, with the next frame
+        self.assertEqual(results, [1, 2])
+        Clock.tick()
+        self.assertEqual(results, [1, 2, 1, 2, 0, ZeroDivisionError])
+        # the failed job was rolled back
+        self.assertEqual(self.publishers(), ['Marvel', 'DC'])
+
+
+class TestTitleRow(unittest.TestCase):
+
+    def test_lazy_decoding(self):
+
+        columns = TitleRow.column_indices([('id',), ('title',), ('odd_issues',), ('owned_issues',), ('notes',),
+                                           ('issue_notes',), ('publishers',)])
+        row = TitleRow(columns, (5, 'Batman', '["1a", 2]', '1-3,1a', None, None, 'Marvel, DC'))
+        self.assertEqual(row['title'], 'Batman')
+        self.assertFalse(row.is_decoded('odd_issues'))
+        self.assertEqual(row['odd_issues'], ['1a', 2])
+        self.assertTrue(row.is_decoded('odd_issues'))
+        # decoded once, later lookups return the same object
+        self.assertIs(row['owned_issues'], row['owned_issues'])
+        self.assertEqual(len(row['owned_issues']), 4)
+        self.assertEqual((row['notes'], row['issue_notes'], row['publishers']), ('', {}, 'DC, Marvel'))
+
+        self.assertIsNone(row.get('dropdown'))
+        row['dropdown'] = 'info'
+        self.assertEqual(row.get('dropdown'), 'info')
+        self.assertIn('dropdown', row)
+        with self.assertRaises(KeyError):
+            row['volume']
+
+    def test_row_factory(self):
+
+        conn = connect(':memory:')
+        conn.execute("CREATE TABLE TITLES (id INTEGER PRIMARY KEY, title TEXT, publisher TEXT)")
+        conn.executemany("INSERT INTO TITLES (title, publisher) VALUES (?, ?)",
+                         [('Batman', 'DC'), ('Flash', 'DC'), ('Hulk', 'Marvel')])
+        rows = TitleRow.from_cursor(conn.execute("SELECT * FROM TITLES ORDER BY id"))
+        self.assertEqual([(r['id'], r['title']) for r in rows], [(1, 'Batman'), (2, 'Flash'), (3, 'Hulk')])
+        # rows of a query share their column index, and repeated publishers are stored once
+        self.assertIs(rows[0].columns, rows[2].columns)
+        self.assertIs(rows[0]['publisher'], rows[1]['publisher'])
+        again = TitleRow.from_cursor(conn.execute("SELECT * FROM TITLES WHERE id = 1"))
+        self.assertIs(again[0].columns, rows[0].columns)
+
+
+class TestTransfer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.database = ConnectionManager(join(self.tmp.name, 'comics.db'))
+        with self.database.writing() as queries:
+            cur = queries.conn.cursor()
+            for create in (ComicsApp.create_formats_table, ComicsApp.create_publishers_table,
+                           ComicsApp.create_groups_table, ComicsApp.create_titles_table,
+                           ComicsApp.create_title_publishers_table):
+                create(cur)
+            queries.execute('insert_publisher', ('Marvel',), cur)
+
+    def tearDown(self):
+        self.database.close()
+        self.tmp.cleanup()
+
+    def test_validation(self):
+
+        self.assertEqual(parse_standard_issues('12+'), ('12+', range(1, 13), True))
+        self.assertEqual(parse_standard_issues('30-25'), ('25-30', range(25, 31), False))
+        self.assertIsNone(parse_standard_issues('12a'))
+        strings, specials, numbers, errors = split_odd_issues('1b, 3_, 1a, 0, 5, 7_', range(1, 6))
+        self.assertEqual((strings, specials, numbers, sorted(errors)), (['1a', '1b'], ['3_'], [0], ['5', '7_']))
+        self.assertEqual(validate_date('3.2001'), False)
+        self.assertEqual(validate_date('03.2001'), '03/2001')
+        self.assertEqual(validate_date('31/02/2001'), False)
+
+        # owned issues left over after total issues went down, shared by ScreenNew and the importer
+        owned = OwnedIssues([1, 2, 3, '1a', 0, 7])
+        self.assertEqual(excess_owned_issues(owned, range(1, 4), ['1a', 0]), [7])
+        self.assertEqual(excess_owned_issues(owned, range(1, 8), ['1a', 0]), [])
+        self.assertFalse(collection_complete(owned, range(1, 4), ['1a', 0], False))
+        self.assertTrue(collection_complete(owned, range(1, 5), ['1a', 0], False))
+        self.assertFalse(collection_complete(owned, range(1, 5), ['1a', 0], True))
+
+    def test_import_export(self):
+
+        rows = [{'title': 'Secret Wars', 'publisher': 'Marvel', 'standard_issues': '12', 'odd_issues': '1a',
+                 'owned_issues': '1-12, 1a', 'format': 'Comic', 'group': 'Events, Marvel Events'},
+                {'title': 'Avengers vs. JLA', 'publisher': ['Marvel', 'DC'], 'standard_issues': 4,
+                 'owned_issues': [1, 2], 'group': ['Marvel Events'], 'start_date': '09/2003'},
+                {'title': 'Too Many', 'publisher': 'DC', 'standard_issues': '3', 'owned_issues': '4'},
+                {'title': 'Spawn', 'publisher': 'Image', 'standard_issues': '300+', 'owned_issues': '1-3'}]
+        importer = import_titles(self.database, rows, batch_size=2)
+        self.assertEqual((importer.imported, importer.skipped), (3, 1))
+
+        queries = self.database.reader()
+        titles = queries.conn.execute("SELECT title, publisher_id, format, owned_issues, start_date, grouping "
+                                      "FROM TITLES ORDER BY id").fetchall()
+        self.assertEqual(titles, [('Secret Wars', 1, 1, 'complete', None, '2'),
+                                  ('Avengers vs. JLA', None, None, '1-2', '09/2003', '2'),
+                                  ('Spawn', 3, None, '1-3', None, None)])
+        self.assertEqual(queries.conn.execute("SELECT * FROM TITLE_PUBLISHERS").fetchall(), [(2, 1), (2, 2)])
+        self.assertEqual(queries.conn.execute("SELECT * FROM GROUPS").fetchall(),
+                         [(1, 'Events', None), (2, 'Marvel Events', 1)])
+
+        counts = export_tables(queries, join(self.tmp.name, 'export'), 'jsonl')
+        self.assertEqual(counts, {'FORMATS': 1, 'PUBLISHERS': 3, 'GROUPS': 2, 'TITLES': 3, 'TITLE_PUBLISHERS': 2})
+        exported = list(read_rows(join(self.tmp.name, 'export', 'GROUPS.jsonl')))
+        self.assertEqual(exported[1], {'id': 2, 'name': 'Marvel Events', 'parent': 1})
+
+    def test_import_json_fields(self):
+
+        row = {'title': 'X-Men', 'publisher': 'Marvel', 'standard_issues': '3', 'owned_issues': '1'}
+        malformed = [dict(row, issue_notes='"str"'), dict(row, other_editions='[1, 2]'),
+                     dict(row, other_editions='{"TPB": "1-3"}'), dict(row, issue_notes='{1: "x"}')]
+        importer = import_titles(self.database, malformed + [
+            dict(row, other_editions='{"TPB": {"owned_issues": [1, 2, 4], "issues": "4"}}',
+                 issue_notes={'1': 'signed'})])
+        self.assertEqual((importer.imported, importer.skipped), (1, 4))
+
+        title = self.database.reader().conn.execute("SELECT other_editions, issue_notes FROM TITLES").fetchone()
+        self.assertEqual(loads(title[0]), {'TPB': {'owned_issues': '1-2,4', 'issues': '4'}})
+        self.assertEqual(loads(title[1]), {'1': 'signed'})
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+""" Titles as read from the database, decoding JSON and encoded columns only when they are first used
+
+    The home list fetches whole pages of titles but only shows a title and its progress, so decoding other
+    editions or issue notes of every fetched title would be wasted on titles that never get opened.
+    Rows are built by a cursor's row_factory, sharing one object for each publisher, format and group value.
+"""
+from json import loads
+
+from comics_issues import decode_owned_issues
+
+
+def decode_json(value):
+    """ Return JSON column value decoded, NULL and empty values as they are """
+    return loads(value) if value else value
+
+
+def decode_issue_notes(value):
+    """ Return issue notes by issue, an empty dict for NULL """
+    return loads(value) if value else {}
+
+
+def decode_notes(value):
+    """ Return notes, an empty string for NULL """
+    return value or ''
+
+
+def decode_publishers(value):
+    """ Return publishers of an inter company cross over sorted, as group_concat doesn't guarantee any order """
+    return ', '.join(sorted(value.split(', '))) if value else value
+
+
+# decoders of columns that aren't used as stored, by column name
+DECODERS = {
+    'odd_issues': decode_json,
+    'other_editions': decode_json,
+    'issue_notes': decode_issue_notes,
+    'owned_issues': decode_owned_issues,
+    'notes': decode_notes,
+    'publishers': decode_publishers,
+}
+
+
+# columns whose values repeat across many titles, stored once however many titles hold them
+SHARED_COLUMNS = ('publisher', 'publishers', 'format', 'grouping')
+
+
+class TitleRow(object):
+    """ Title read from the database, looked up like a dict by column name
+
+        Columns listed in DECODERS are decoded on first access and kept, every other column is returned as stored.
+        Values can be assigned to any key, eg. the 'dropdown' the list keeps open for a title.
+    """
+
+    __slots__ = ('columns', 'values', 'decoded')
+
+    # (column indices by name, indices of SHARED_COLUMNS) by the column names of a query
+    layouts = {}
+    # cursor description the last row was built from, and its layout
+    last_layout = (None, None)
+    # values of SHARED_COLUMNS, each stored once
+    shared_values = {}
+
+    def __init__(self, columns, values):
+        # index into values by column name, shared by all rows of the same query
+        self.columns = columns
+        self.values = values
+        # decoded and assigned values by key, created when the first one is stored
+        self.decoded = None
+
+    @staticmethod
+    def column_indices(description):
+        """ Return index by column name of a cursor's description """
+        return {d[0]: i for i, d in enumerate(description)}
+
+    @classmethod
+    def layout(cls, description):
+        """ Return (column indices by name, indices of shared columns) of a cursor's description
+
+            Rows of every query with the same columns share the same index, so a row costs its values and slots only.
+        """
+        last_description, layout = cls.last_layout
+        if description is last_description:
+            return layout
+        names = tuple(d[0] for d in description)
+        if names not in cls.layouts:
+            cls.layouts[names] = (cls.column_indices(description),
+                                  tuple(i for i, name in enumerate(names) if name in SHARED_COLUMNS))
+        layout = cls.layouts[names]
+        cls.last_layout = (description, layout)
+        return layout
+
+    @classmethod
+    def from_row(cls, cursor, values):
+        """ Return title row of a SQLite row, to be used as a cursor's row_factory """
+        columns, shared = cls.layout(cursor.description)
+        if shared:
+            values = list(values)
+            for i in shared:
+                values[i] = cls.shared_values.setdefault(values[i], values[i])
+            values = tuple(values)
+        return cls(columns, values)
+
+    @classmethod
+    def from_cursor(cls, cur):
+        """ Return list of title rows of every row left in cursor """
+        cur.row_factory = cls.from_row
+        return cur.fetchall()
+
+    def __getitem__(self, key):
+        if self.decoded is not None and key in self.decoded:
+            return self.decoded[key]
+        value = self.values[self.columns[key]]
+        decoder = DECODERS.get(key)
+        if decoder is None:
+            return value
+        value = self[key] = decoder(value)
+        return value
+
+    def __setitem__(self, key, value):
+        if self.decoded is None:
+            self.decoded = {}
+        self.decoded[key] = value
+
+    def __contains__(self, key):
+        return key in self.columns or (self.decoded is not None and key in self.decoded)
+
+    def get(self, key, default=None):
+        """ Return value of key, default if the title has no such column and nothing was assigned to it """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """ Return column names followed by keys assigned to, eg. for dict(row) """
+        keys = list(self.columns)
+        if self.decoded is not None:
+            keys += [k for k in self.decoded if k not in self.columns]
+        return keys
+
+    def is_decoded(self, key):
+        """ Return whether key was decoded or assigned already """
+        return self.decoded is not None and key in self.decoded
+
+    def __repr__(self):
+        return "TitleRow({!r})".format(self.values)
@@ -0,0 +1,302 @@
+""" Import titles from CSV or JSON Lines files, and export every table of the database, without the app
+
+    Usage: python comics_transfer.py import titles.csv [--database path] [--batch-size 5000]
+           python comics_transfer.py export directory [--database path] [--format csv]
+
+    Imported rows hold a title's fields by name, like the columns of a spreadsheet:
+        title, volume, standard_issues (12, 25-100 or 12+ for ongoing series), notes
+        publisher: name, or comma separated names of an inter company cross over
+        format: name, group: comma separated chain of group names, from the top level group down
+        odd_issues, owned_issues: comma separated issues, or 'complete' for owned_issues
+        start_date, end_date: DD/MM/YYYY, MM/YYYY or YYYY
+        other_editions, issue_notes: JSON objects
+    JSON Lines rows may hold lists instead of comma separated text. Rows that don't validate are reported and
+    skipped, all others are written in a single transaction, which a database error rolls back completely.
+
+    Export writes a file per table, holding its rows as stored. Rows are streamed, so memory use doesn't grow with the
+    size of the collection.
+"""
+from os import environ
+# keep kivy from parsing the command line arguments
+environ.setdefault('KIVY_NO_ARGS', '1')
+
+from argparse import ArgumentParser
+from csv import DictReader, writer
+from datetime import datetime
+from json import dumps, loads
+from os import makedirs
+from os.path import isfile, join, splitext
+
+from comics_database import ConnectionManager
+from comics_issues import IssueNumber, OwnedIssues, decode_owned_issues
+from comics_queries import Queries
+from comics_validation import collection_complete, excess_owned_issues, parse_standard_issues, split_odd_issues, \
+                              validate_date
+
+# titles inserted with each executemany
+BATCH_SIZE = 5000
+
+# rows fetched from the database at once while exporting
+EXPORT_ARRAY_SIZE = 1000
+
+
+def read_rows(path):
+    """ Yield every row of a CSV or JSON Lines (.jsonl) file as dict, one at a time """
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if splitext(path)[1].lower() in ('.jsonl', '.json'):
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+        else:
+            yield from DictReader(f)
+
+
+def split_names(value):
+    """ Return list of names of a comma separated text or list, without empty names """
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value or '').split(',') if v.strip()]
+
+
+def load_json(value):
+    """ Return JSON object of text, objects of JSON Lines rows as they are """
+    if isinstance(value, str):
+        return loads(value) if value.strip() else None
+    return value
+
+
+class TitleImporter(object):
+    """ Validate rows of titles and insert them in batches, adding publishers, formats and groups that are new
+
+        Ids of publishers, formats and groups are cached by name, so each one is looked up once per import.
+        Has to be used within a transaction of the writer, see import_titles.
+    """
+
+    def __init__(self, queries, batch_size=BATCH_SIZE):
+        self.queries = queries
+        self.cur = queries.conn.cursor()
+        self.batch_size = batch_size
+        # ids by name, None for no name
+        self.publisher_ids = {}
+        self.format_ids = {None: None}
+        # group ids by (name, parent id)
+        self.group_ids = {}
+        # titles and links to their publishers, waiting to be inserted
+        self.titles = []
+        self.title_publishers = []
+        self.last_id = queries.execute('titles_last_id').fetchone()[0]
+        self.imported = 0
+        self.skipped = 0
+
+    def publisher_id(self, name):
+        """ Return id of publisher, adding it if it's new """
+        if name not in self.publisher_ids:
+            row = self.queries.execute('publisher_id', (name,), self.cur).fetchone()
+            self.publisher_ids[name] = row[0] if row else self.queries.execute('insert_publisher', (name,),
+                                                                               self.cur).lastrowid
+        return self.publisher_ids[name]
+
+    def format_id(self, name):
+        """ Return id of format, adding it if it's new, None if no format is given """
+        if name not in self.format_ids:
+            row = self.queries.execute('format_id', (name,), self.cur).fetchone()
+            self.format_ids[name] = row[0] if row else self.queries.execute('insert_format', (name,), self.cur).lastrowid
+        return self.format_ids[name]
+
+    def group_id(self, group_chain):
+        """ Return id of the last group of group_chain, adding groups that don't exist yet, like ScreenNew """
+        parent = None
+        for name in group_chain:
+            key = (name, parent)
+            if key not in self.group_ids:
+                # group names are unique, an existing group is used whatever its parent
+                row = self.queries.execute('group_by_name', (name,), self.cur).fetchone()
+                self.group_ids[key] = row[0] if row else self.queries.execute('insert_group', (name, parent),
+                                                                              self.cur).lastrowid
+            parent = self.group_ids[key]
+        return parent
+
+    @staticmethod
+    def title_data(row):
+        """ Return title data of row as ScreenNew holds it on submit, raising ValueError if it doesn't validate """
+
+        data = {'title': str(row.get('title') or '').strip(), 'volume': str(row.get('volume') or '').strip(),
+                'notes': row.get('notes')}
+        if not data['title']:
+            raise ValueError("No comic title entered")
+
+        parsed = parse_standard_issues(str(row.get('standard_issues') or ''))
+        if parsed is None:
+            raise ValueError("Not sure what to do with {!r} standard issues".format(row.get('standard_issues')))
+        data['standard_issues'], standard_issues, ongoing_series = parsed
+
+        strings, specials, numbers, errors = split_odd_issues(', '.join(split_names(row.get('odd_issues'))),
+                                                              standard_issues)
+        if errors:
+            raise ValueError("Odd issues {} conflict with standard issues".format(', '.join(map(str, errors))))
+        data['odd_issues'] = strings + specials + numbers
+
+        owned = decode_owned_issues(','.join(split_names(row.get('owned_issues'))))
+        if owned != 'complete':
+            invalid = [str(i) for i in owned if IssueNumber.parse(str(i)) is None]
+            if invalid:
+                raise ValueError("Owned issues {} aren't valid issue numbers".format(', '.join(invalid)))
+            if not owned:
+                raise ValueError("No owned issues given")
+            excess = excess_owned_issues(owned, standard_issues, data['odd_issues'])
+            if excess:
+                raise ValueError("Owned issues {} aren't contained in given issues".format(', '.join(map(str, excess))))
+            if collection_complete(owned, standard_issues, data['odd_issues'], ongoing_series):
+                owned = 'complete'
+        data['owned_issues'] = owned
+
+        for field in ('start_date', 'end_date'):
+            date = str(row.get(field) or '').strip()
+            if date:
+                data[field] = validate_date(date)
+                if not data[field]:
+                    raise ValueError("{} {!r} is not a valid date".format(field, date))
+
+        try:
+            data['other_editions'] = load_json(row.get('other_editions'))
+            data['issue_notes'] = load_json(row.get('issue_notes'))
+        except ValueError as error:
+            raise ValueError("Other editions or issue notes aren't valid JSON ({})".format(error))
+        for field in ('other_editions', 'issue_notes'):
+            if data[field] and not isinstance(data[field], dict):
+                raise ValueError("{} {!r} is not a JSON object".format(field, data[field]))
+        # owned issues of other editions get encoded like those of the title
+        for name, edition in (data['other_editions'] or {}).items():
+            if not isinstance(edition, dict):
+                raise ValueError("Other edition {!r} is not a JSON object".format(name))
+            if isinstance(edition.get('owned_issues'), list):
+                edition['owned_issues'] = OwnedIssues(edition['owned_issues'])
+        return data
+
+    def add(self, row):
+        """ Validate row and queue its title, writing the queue once it holds batch_size titles """
+
+        data = self.title_data(row)
+        publishers = split_names(row.get('publisher'))
+        if not publishers:
+            raise ValueError("No publisher entered")
+
+        publisher_ids = sorted({self.publisher_id(p) for p in publishers})
+        data['publisher_id'] = publisher_ids[0] if len(publisher_ids) == 1 else None
+        data['format'] = self.format_id(str(row.get('format') or '').strip() or None)
+        data['grouping'] = self.group_id(split_names(row.get('group')))
+
+        parameters = Queries.title_parameters(data)
+        self.last_id += 1
+        parameters['id'] = self.last_id
+        self.titles.append(parameters)
+        # inter company cross overs get linked to their publishers
+        if len(publisher_ids) > 1:
+            self.title_publishers.extend((self.last_id, p_id) for p_id in publisher_ids)
+        if len(self.titles) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Insert queued titles and their publisher links """
+        if self.titles:
+            self.queries.executemany('import_title', self.titles, self.cur)
+            self.queries.executemany('insert_title_publisher', self.title_publishers, self.cur)
+            self.imported += len(self.titles)
+            print("{} titles imported".format(self.imported))
+            self.titles.clear()
+            self.title_publishers.clear()
+
+    def import_rows(self, rows):
+        """ Import every valid title of rows, reporting those that are skipped """
+        for line, row in enumerate(rows, 1):
+            try:
+                self.add(row)
+            except ValueError as error:
+                self.skipped += 1
+                print("Row {} skipped: {}".format(line, error))
+        self.flush()
+
+
+def import_titles(database, rows, batch_size=BATCH_SIZE):
+    """ Import rows of titles in a single transaction and return the importer, with its counts """
+    with database.writing() as queries:
+        importer = TitleImporter(queries, batch_size)
+        importer.import_rows(rows)
+    return importer
+
+
+def exported_tables(conn):
+    """ Return names of tables holding data of their own, leaving out SQLite's and those of full text search """
+    tables = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%'")
+    tables = tables.fetchall()
+    virtual = [name for name, sql in tables if sql.upper().startswith('CREATE VIRTUAL')]
+    return [name for name, sql in tables if not any(name == v or name.startswith(v + '_') for v in virtual)]
+
+
+def export_tables(queries, directory, file_format='csv'):
+    """ Write every table to directory, as <table>.csv or <table>.jsonl, and return the number of rows by table
+
+        All tables are read within one read transaction, so they are exported as they were at the same time.
+    """
+    makedirs(directory, exist_ok=True)
+    counts = {}
+    conn = queries.conn
+    conn.execute("BEGIN")
+    try:
+        for table in exported_tables(conn):
+            cur = conn.cursor()
+            cur.arraysize = EXPORT_ARRAY_SIZE
+            cur.execute("SELECT * FROM '{}'".format(table))
+            columns = [d[0] for d in cur.description]
+            count = 0
+            with open(join(directory, '{}.{}'.format(table, file_format)), 'w', newline='', encoding='utf-8') as f:
+                if file_format == 'csv':
+                    out = writer(f)
+                    out.writerow(columns)
+                    rows = cur.fetchmany()
+                    while rows:
+                        # NULL is written as empty field
+                        out.writerows(rows)
+                        count += len(rows)
+                        rows = cur.fetchmany()
+                else:
+                    rows = cur.fetchmany()
+                    while rows:
+                        f.writelines(dumps(dict(zip(columns, row))) + '\n' for row in rows)
+                        count += len(rows)
+                        rows = cur.fetchmany()
+            counts[table] = count
+            print("{} rows of {} exported".format(count, table))
+    finally:
+        conn.rollback()
+    return counts
+
+
+def main():
+    parser = ArgumentParser(description="Import titles from CSV or JSON Lines, or export every table")
+    parser.add_argument('command', choices=('import', 'export'))
+    parser.add_argument('path', help="file to import, or directory to export to")
+    parser.add_argument('--database', default='database/ComicsDatabase.db')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="titles inserted at once")
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv', help="format of exported tables")
+    args = parser.parse_args()
+
+    if not isfile(args.database):
+        parser.error("{} doesn't exist, start the app once to create it".format(args.database))
+
+    start = datetime.now()
+    database = ConnectionManager(args.database)
+    try:
+        if args.command == 'import':
+            importer = import_titles(database, read_rows(args.path), args.batch_size)
+            print("{} titles imported, {} rows skipped".format(importer.imported, importer.skipped))
+        else:
+            export_tables(database.reader(), args.path, args.format)
+    finally:
+        database.close()
+    print(datetime.now() - start)
+
+
+if __name__ == '__main__':
+    main()
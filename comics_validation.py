@@ -0,0 +1,123 @@
+""" Validation of a title's issues and dates, as entered on ScreenNew or read by the importer
+
+    Plain functions without widgets, so titles can be validated without a Kivy window.
+"""
+from datetime import datetime
+from re import match
+
+from comics_issues import IssueNumber, OwnedIssues
+
+
+def parse_standard_issues(issues):
+    """ Return (value as stored, range of standard issues, whether the series is ongoing) of issues text
+
+        Issues are a count, like 12, a range, like 25-100, or a count followed by '+' for ongoing series.
+        Returns None if issues is none of these.
+    """
+    issues = issues.strip()
+    if match(r'^[1-9]\d*[+]$', issues):
+        # handle ongoing series
+        return issues, range(1, int(issues[:-1]) + 1), True
+    elif match(r'^[1-9]\d*[\-][1-9]\d*$', issues):
+        # handle ranges, like 25-100, etc.
+        first, last = sorted(issues.split("-"), key=int)
+        return '{}-{}'.format(first, last), range(int(first), int(last) + 1), False
+    elif match(r'^[1-9]\d*$', issues):
+        # handle integers
+        return int(issues), range(1, int(issues) + 1), False
+    return None
+
+
+def split_odd_issues(odd_issues, standard_issues):
+    """ Return four lists of odd issues text, comma separated
+            sorted issues like '1a, 1b, etc.', sorted variants of standard issues, like '1_, 2_b',
+            sorted numbers outside of standard_issues, like 0, -1 and 1.5,
+            and conflicts: numbers within standard_issues and variants of issues outside of them
+        Invalid issue numbers are ignored.
+    """
+    # create empty lists
+    strings_list = []
+    numbers_list = []
+    special_list = []
+    error_list = []
+
+    # split numeric values from strings
+    for text in set([i.strip() for i in odd_issues.split(',')]):
+        # handle trailing (or just extra) commas by checking if issue
+        if text:
+            # parse once, invalid issue numbers are ignored
+            issue = IssueNumber.parse(text)
+            if issue is None:
+                continue
+
+            if issue.is_number:
+                if not issue.in_range(standard_issues):
+                    numbers_list.append(issue)
+                else:
+                    error_list.append(str(issue.value))
+            elif issue.is_variant:
+                if issue.in_range(standard_issues):
+                    special_list.append(issue)
+                else:
+                    error_list.append(issue.value)
+            else:
+                strings_list.append(issue)
+
+    # sort lists by issue number
+    strings_list.sort()
+    special_list.sort()
+    numbers_list.sort()
+    strings_list, special_list, numbers_list = ([i.value for i in l] for l in (strings_list, special_list, numbers_list))
+
+    # return sorted lists
+    return strings_list, special_list, numbers_list, error_list
+
+
+def excess_owned_issues(owned_issues, standard_issues, odd_issues):
+    """ Return owned issues contained neither in standard_issues nor in odd_issues
+
+        Owned issues are kept while total issues get changed, so eg. 18, 19 and 20 stay owned after 20 total issues
+        are changed to 15, see ScreenNew.remove_excess_issues.
+    """
+    return [i for i in owned_issues
+            if i not in odd_issues and not (OwnedIssues.is_standard(i) and i in standard_issues)]
+
+
+def collection_complete(owned_issues, standard_issues, odd_issues, ongoing_series):
+    """ Return whether every standard and odd issue is owned, which never is the case for ongoing series
+
+        Owned issues have to be checked with excess_owned_issues first.
+    """
+    return not ongoing_series and len(owned_issues) == len(standard_issues) + len(odd_issues)
+
+
+def validate_date(date):
+    """ Return date as DD/MM/YYYY, MM/YYYY or YYYY, False if it isn't a valid date in any of these formats
+
+        Days, months and years may be separated by '/', '.', '-' or nothing at all.
+    """
+    if match(r'^((19)|(20))\d{2}$', date):
+        # check yyyy
+        return date
+    else:
+        d_format = str()
+        delimiter = ''
+
+        if match(r'^[01]\d[.\/-]?[12][90]\d{2}$', date):
+            # check mm/yyyy
+            delimiter = date[2] if len(date) == 7 else ''
+            d_format = '%m{0}%Y'
+
+        elif match(r'^[0-3]\d[.\/-]?[01]\d[.\/-]?[12][90]\d{2}$', date):
+            # dd/mm/yyyy
+            delimiter = date[2] if len(date) == 10 else ''
+            if delimiter and delimiter == date[5]:
+                d_format = '%d{0}%m{0}%Y'
+            else:
+                return False
+        try:
+            time_stamp = datetime.strptime(date, d_format.format(delimiter))
+            if time_stamp:
+                return time_stamp.strftime(d_format.format('/'))
+        except ValueError:
+            return False
@@ -1,16 +1,29 @@
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Mesh, Rectangle
 from kivy.lang import Builder
-from kivy.properties import BooleanProperty, DictProperty, NumericProperty, ObjectProperty, StringProperty
+from kivy.metrics import dp, sp
+from kivy.properties import BooleanProperty, ListProperty, NumericProperty, ObjectProperty, StringProperty
+from kivy.uix.behaviors import ButtonBehavior
 from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.gridlayout import GridLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.uix.screenmanager import Screen
 from kivy.uix.textinput import TextInput
-from kivy.uix.togglebutton import ToggleButton
+from kivy.uix.treeview import TreeViewLabel
+from kivy.uix.widget import Widget
+from kivy.utils import escape_markup
 
 from datetime import datetime
+from functools import partial
 from re import match
 
+from comics_issues import OwnedIssues
+from comics_collation import title_sort_key
+from comics_search import HIGHLIGHT_END, HIGHLIGHT_START
+from comics_validation import validate_date
+
 Builder.load_file('comics_widgets.kv')
 
 
@@ -31,10 +44,15 @@ class ComicsScreen(Screen):
         return publisher.lower()
 
     @staticmethod
-    def sort_ignore_prefix(unsorted_list, ignore='the '):
-        """ Return list sorted database indices ignore specified prefix """
-        return sorted(unsorted_list,
-                      key=lambda a: a['title'][len(ignore):] if a['title'].lower().startswith(ignore) else a['title'])
+    def title_sort_key(title):
+        """ Return title's sort key as stored in the database, computing it for titles without one """
+        key = title.get('sort_key')
+        return title_sort_key(title['title'], title.get('volume')) if key is None else key
+
+    @classmethod
+    def sort_ignore_prefix(cls, unsorted_list):
+        """ Return list sorted by title, ignoring leading articles, case and accents """
+        return sorted(unsorted_list, key=cls.title_sort_key)
 
 
 class FieldBox(BoxLayout):
@@ -115,35 +133,7 @@ class DateInput(MyTextInput):
     def validate_date(self, date):
 
         self.date_valid = False
-
-        if match(r'^((19)|(20))\d{2}$', date):
-            # check yyyy
-            # print('date format: yyyy')
-            return date
-        else:
-            d_format = str()
-            delimiter = ''
-
-            if match(r'^[01]\d[.\/-]?[12][90]\d{2}$', date):
-                # check mm/yyyy
-                # print('date format: mm-yyyy')
-                delimiter = date[2] if len(date) == 7 else ''
-                d_format = '%m{0}%Y'
-
-            elif match(r'^[0-3]\d[.\/-]?[01]\d[.\/-]?[12][90]\d{2}$', date):
-                # dd/mm/yyyy
-                # print('date format: dd/mm/yyyy')
-                delimiter = date[2] if len(date) == 10 else ''
-                if delimiter and delimiter == date[5]:
-                    d_format = '%d{0}%m{0}%Y'
-                else:
-                    return False
-            try:
-                time_stamp = datetime.strptime(date, d_format.format(delimiter))
-                if time_stamp:
-                    return time_stamp.strftime(d_format.format('/'))
-            except ValueError:
-                return False
+        return validate_date(date)
 
 
 class PredictiveTextInput(MyTextInput):
@@ -151,8 +141,8 @@ class PredictiveTextInput(MyTextInput):
 
     current_suggested_word = StringProperty()
 
-    def suggest_text(self, db_cursor, db_table, table_field):
-        """ Display suggested text """
+    def suggest_text(self, suggestions, field):
+        """ Request suggested text, which gets displayed once the user pauses typing """
         # reset suggestions
         self.suggestion_text = '  '
         self.current_suggested_word = ''
@@ -161,17 +151,10 @@ class PredictiveTextInput(MyTextInput):
         if self.text and not self.text.endswith(' '):
             # get the last (or only) word in string
             text = self.text.split()[-1]
-            # get a suggestion string
-            result = self.get_text_suggestion(db_cursor, text, db_table, table_field)
-            # set suggestion_text
-            if result:
-                # set a variable to hold entire suggested string
-                self.current_suggested_word = result
-                # shorten suggestion_text according to typed text, if necessary
-                self.suggestion_text = result[len(text):] + '  '
-                if text.lower() == self.current_suggested_word.lower().strip():
-                    self.suggestion_text = '  '
-                    self.current_suggested_word = ''
+            # get a suggestion string, replacing any request still pending for previous text
+            suggestions.request(self, field, text, partial(self.show_suggestion, text))
+        else:
+            suggestions.cancel(self)
 
     def suggest_text_from_list(self, word_list):
 
@@ -188,27 +171,19 @@ class PredictiveTextInput(MyTextInput):
                 if word.lower().startswith(text.lower()):
                     result = word
                     break
-            if result:
-                # set a variable to hold entire suggested string
-                self.current_suggested_word = result
-                # shorten suggestion_text according to typed text, if necessary
-                self.suggestion_text = result[len(text):] + '  '
-                if text.lower() == self.current_suggested_word.lower().strip():
-                    self.suggestion_text = '  '
-                    self.current_suggested_word = ''
-
-    @staticmethod
-    def get_text_suggestion(db_cursor, text, db_table, table_field):
-        """ Search database for possible string suggestions matching last word of user input """
-
-        # search database
-        sql_dict = {'table': db_table, 'field': table_field, 'text': text}
-        sql = "SELECT {field} FROM {table} WHERE {field} LIKE '{text}%'".format_map(sql_dict)
-        suggestions = db_cursor.execute(sql).fetchall()
-
-        if suggestions:
-            # create a sorted list from possible words and select the longest
-            return sorted([word[0] for word in suggestions], key=len)[-1]
+            self.show_suggestion(text, result)
+
+    def show_suggestion(self, text, result):
+        """ Display suggested text for typed text """
+        # set suggestion_text
+        if result:
+            # set a variable to hold entire suggested string
+            self.current_suggested_word = result
+            # shorten suggestion_text according to typed text, if necessary
+            self.suggestion_text = result[len(text):] + '  '
+            if text.lower() == self.current_suggested_word.lower().strip():
+                self.suggestion_text = '  '
+                self.current_suggested_word = ''
 
     def complete_string(self, ending=' '):
         """ If suggested text is available, hitting enter will update text string """
@@ -222,41 +197,202 @@ class PredictiveTextInput(MyTextInput):
         return self.text.find(last_word)
 
 
-class IssueToggleButton(ToggleButton):
-
-    def __init__(self, container, user_data, **kwargs):
-        super(IssueToggleButton, self).__init__(**kwargs)
-        self.container = container
-        self.user_data = user_data
+class IssueGrid(Widget):
+    """ Grid of issue cells, all drawn on the grid's own canvas instead of being one ToggleButton each
+
+        Cell backgrounds are batched into a mesh per state, and touches are hit-tested by the grid itself. Tapping a
+        cell toggles its issue in owned, dragging from it sets every issue up to the cell under the touch to the
+        same state.
+    """
+
+    # issue numbers in display order, None leaves a cell blank
+    issues = ListProperty()
+    # text shown in the cell after the last issue, eg. '. . .' for ongoing series
+    trailing_text = StringProperty()
+    # show owned issues only, ignoring touches
+    readonly = BooleanProperty(False)
+
+    cols = NumericProperty(10)
+    cell_height = NumericProperty(dp(25))
+    spacing = NumericProperty(dp(2))
+    padding = NumericProperty(dp(5))
+
+    background_color = ListProperty([.2, .2, .2, 1])
+    owned_background_color = ListProperty([.25, .25, .25, 1])
+    color = ListProperty([.5, .5, .5, 1])
+    owned_color = ListProperty([.2, .7, .9, 1])
+
+    # cell text textures, shared by all grids
+    textures = {}
+    # cells per mesh, keeping vertex indices within 16 bit
+    mesh_cells = 10000
+
+    __events__ = ('on_selection',)
+
+    def __init__(self, **kwargs):
+        super(IssueGrid, self).__init__(**kwargs)
+        # set of owned issues (usually OwnedIssues), changed in place by selecting cells
+        self.owned = OwnedIssues()
+        # anchor cell, state being applied and owned state of every cell when the current drag started
+        self.drag = None
+        self.trigger_redraw = Clock.create_trigger(self.redraw)
+        self.bind(pos=self.trigger_redraw, size=self.trigger_redraw,
+                  disabled=self.trigger_redraw, trailing_text=self.update_height, issues=self.update_height,
+                  cols=self.update_height, cell_height=self.update_height)
+        self.update_height()
+
+    def on_selection(self):
+        """ Dispatched after owned issues changed through the grid """
+        pass
+
+    def show(self, issues, owned, trailing_text=''):
+        """ Show issues, highlighting the ones in owned """
+        self.owned = owned
+        self.trailing_text = trailing_text
+        self.issues = issues
+        self.trigger_redraw()
+
+    def clear(self):
+        """ Remove all cells """
+        self.show([], OwnedIssues())
+
+    def update_height(self, *args):
+        """ Fit height to the number of rows """
+        cells = len(self.issues) + bool(self.trailing_text)
+        rows = -(-cells // self.cols)
+        self.height = rows * (self.cell_height + self.spacing) - self.spacing + 2 * self.padding if rows else 0
+        self.trigger_redraw()
+
+    def cell_width(self):
+        return (self.width - 2 * self.padding - (self.cols - 1) * self.spacing) / self.cols
+
+    def cell_pos(self, index):
+        """ Return bottom left corner of cell at index """
+        row, col = divmod(index, self.cols)
+        return (self.x + self.padding + col * (self.cell_width() + self.spacing),
+                self.top - self.padding - row * (self.cell_height + self.spacing) - self.cell_height)
+
+    def cell_at(self, x, y):
+        """ Return index of the issue cell at window coordinates x, y, None if there isn't any """
+        col = int((x - self.x - self.padding) // (self.cell_width() + self.spacing))
+        row = int((self.top - self.padding - y) // (self.cell_height + self.spacing))
+        if not 0 <= col < self.cols or row < 0:
+            return None
+        index = row * self.cols + col
+        if index < len(self.issues) and self.issues[index] is not None:
+            return index
+        return None
+
+    @classmethod
+    def get_texture(cls, text):
+        """ Return (cached) white texture of text, to be tinted by the cell's colour """
+        try:
+            return cls.textures[text]
+        except KeyError:
+            label = CoreLabel(text=text, font_size=sp(15), font_name='fonts/ComicBook.otf')
+            label.refresh()
+            texture = cls.textures[text] = label.texture
+            return texture
+
+    def redraw(self, *args):
+        """ Draw every cell, grouping cells of the same state under one colour """
+
+        self.canvas.clear()
+        cells = {False: [], True: []}
+        for i, issue in enumerate(self.issues):
+            if issue is not None:
+                cells[issue in self.owned].append((i, str(issue)))
+
+        w, h = self.cell_width(), self.cell_height
+        alpha = .5 if self.disabled else 1
+        with self.canvas:
+            for owned, background, color in ((False, self.background_color, self.color),
+                                             (True, self.owned_background_color, self.owned_color)):
+                Color(*background)
+                for start in range(0, len(cells[owned]), self.mesh_cells):
+                    vertices, indices = [], []
+                    for n, (i, text) in enumerate(cells[owned][start:start + self.mesh_cells]):
+                        x, y = self.cell_pos(i)
+                        vertices += [x, y, 0, 0, x + w, y, 0, 0, x + w, y + h, 0, 0, x, y + h, 0, 0]
+                        indices += [4 * n, 4 * n + 1, 4 * n + 2, 4 * n + 2, 4 * n + 3, 4 * n]
+                    Mesh(vertices=vertices, indices=indices, mode='triangles')
+
+                Color(color[0], color[1], color[2], color[3] * alpha)
+                for i, text in cells[owned]:
+                    self.draw_text(i, text, w, h)
+
+            if self.trailing_text:
+                Color(*self.color)
+                self.draw_text(len(self.issues), self.trailing_text, w, h)
+
+    def draw_text(self, index, text, w, h):
+        """ Draw text centred in cell at index """
+        texture = self.get_texture(text)
+        x, y = self.cell_pos(index)
+        Rectangle(texture=texture, size=texture.size,
+                  pos=(int(x + (w - texture.width) / 2), int(y + (h - texture.height) / 2)))
+
+    def set_owned(self, issue, owned):
+        """ Add issue to, or remove it from, owned issues """
+        if owned:
+            self.owned.add(issue)
+        else:
+            self.owned.discard(issue)
 
-    @staticmethod
-    def convert_issue_number(btn_text):
-        """ Convert IssueToggleButton.text from string to appropriate type """
-
-        btn_text = btn_text.strip()
-
-        if match(r'^((-?[1-9]\d{0,3})|0)$', btn_text):
-            # handle ints
-            # print("int: {}".format(btn_text))
-            return int(btn_text)
-        elif match(r'^-?\d{1,4}\.\d{1,2}$', btn_text):
-            # handle fractions
-            # print("float: {}".format(btn_text))
-            return float(btn_text)
-        elif match(r'^-?\d{1,4}((\D{1,2})|((\.\d{1,2})?_((\D|\d){1,2})?))$', btn_text):
-            # handle strings like 1a, 1_, 1_a, 1_ab, 1_a1, etc
-            # print("str: {}".format(btn_text))
-            return str(btn_text)
+    def select(self, issues, owned=True):
+        """ Add issues to, or remove them from, owned issues, notifying once for the whole batch """
+        if owned:
+            self.owned.update(issues)
         else:
-            print("no match: {}".format(btn_text))
+            self.owned.difference_update(issues)
+        self.trigger_redraw()
+        self.dispatch('on_selection')
+
+    def select_all(self, owned=True):
+        """ Set every issue in the grid to owned, or not owned """
+        self.select([issue for issue in self.issues if issue is not None], owned)
+
+    def on_touch_down(self, touch):
+        if self.readonly or self.disabled or not self.collide_point(*touch.pos):
+            return super(IssueGrid, self).on_touch_down(touch)
+        if 'button' in touch.profile and touch.button.startswith('scroll'):
+            return False
+        index = self.cell_at(*touch.pos)
+        if index is None:
+            return False
+
+        owned = [issue is not None and issue in self.owned for issue in self.issues]
+        self.drag = (index, not owned[index], owned, index)
+        touch.grab(self)
+        self.drag_to(index)
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super(IssueGrid, self).on_touch_move(touch)
+        index = self.cell_at(*touch.pos)
+        if index is not None:
+            self.drag_to(index)
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super(IssueGrid, self).on_touch_up(touch)
+        touch.ungrab(self)
+        self.drag = None
+        return True
 
-    def on_state(self, instance, value):
-        """ Add or remove btn from owned issues list """
+    def drag_to(self, index):
+        """ Set issues from the drag's anchor up to index to the dragged state, restoring cells left behind """
 
-        if value == 'down' and self.convert_issue_number(self.text) not in self.user_data['owned_issues']:
-            self.user_data['owned_issues'].append(self.convert_issue_number(self.text))
-        if value == 'normal' and self.convert_issue_number(self.text) in self.user_data['owned_issues']:
-            self.user_data['owned_issues'].remove(self.convert_issue_number(self.text))
+        anchor, state, owned, last = self.drag
+        selected = range(min(anchor, index), max(anchor, index) + 1)
+        for i in range(min(anchor, index, last), max(anchor, index, last) + 1):
+            if self.issues[i] is not None:
+                self.set_owned(self.issues[i], state if i in selected else owned[i])
+        self.drag = (anchor, state, owned, index)
+        self.trigger_redraw()
+        self.dispatch('on_selection')
 
 
 class SpecialIssueNoteInputBox(FieldBox):
@@ -287,19 +423,11 @@ class OtherEditionBox(BoxLayout):
         self.edition_name = edition_name
         self.issues_data = issues_data
 
-        self.issues_data[edition_name] = {'owned_issues': [], 'no_of_issues': edition_issues}
+        self.issues_data[edition_name] = {'owned_issues': OwnedIssues(), 'no_of_issues': edition_issues}
 
         self.ids._editions_label.text = edition_name
 
-        # add issues
-        for i in range(int(edition_issues)):
-
-            new_issue_btn = IssueToggleButton(self.issues_container, self.issues_data[edition_name], text=str(i+1))
-            self.issues_container.add_widget(new_issue_btn)
-
-        # fill up empty spaces
-        for i in range(int(edition_issues % 10)):
-            self.issues_container.add_widget(Label())
+        self.issues_container.show(list(range(1, int(edition_issues) + 1)), self.issues_data[edition_name]['owned_issues'])
 
     def remove_edition(self):
         del self.issues_data[self.edition_name]
@@ -318,13 +446,7 @@ class AnnualsEditionBox(BoxLayout):
 
         self.ids._annuals_label.text = edition_name
 
-        for y in years:
-            new_issue_btn = IssueToggleButton(self.annuals_container, self.issues_data[self.edition_name], text=str(y))
-            self.annuals_container.add_widget(new_issue_btn)
-
-        # fill up empty spaces
-        for i in range(len(years) % 5):
-            self.annuals_container.add_widget(Label())
+        self.annuals_container.show(years, self.issues_data[self.edition_name]['owned_issues'])
 
     def remove_edition(self):
         del self.issues_data[self.edition_name]
@@ -438,71 +560,120 @@ class InfoDropDownContent(BoxLayout):
         return notes
 
 
-class ComicListWidget(BoxLayout):
+class GroupTreeNode(TreeViewLabel):
+    """ Node of the group browser, showing a group with the title and issue counts of its subtree """
+
+    group_id = NumericProperty()
+    name = StringProperty()
+    titles = NumericProperty()
+    owned = NumericProperty()
+    total = NumericProperty()
+
+    @staticmethod
+    def get_counts(titles, owned, total):
+        """ Return counts as shown behind the group's name """
+        if not titles:
+            return "no titles"
+        return "{} title{}, {}/{} issues".format(titles, '' if titles == 1 else 's', owned, total)
+
+
+class SearchResultWidget(RecycleDataViewBehavior, ButtonBehavior, BoxLayout):
+    """ Recyclable row of the home screen's search results, showing a title and where it matched """
+
+    title_id = NumericProperty()
+    title = StringProperty()
+    snippet = StringProperty()
+    screen = ObjectProperty()
+
+    def refresh_view_attrs(self, rv, index, data):
+        """ Bind row to a search result, highlighting the matched words """
+        self.title_id = data['title_id']
+        self.screen = data['screen']
+        self.title = self.highlight(data['title'])
+        self.snippet = self.highlight(data['snippet'].replace('\n', '  '))
+
+    @staticmethod
+    def highlight(text):
+        """ Return markup of text, coloring words between HIGHLIGHT_START and HIGHLIGHT_END """
+        text = escape_markup(text or '')
+        return text.replace(HIGHLIGHT_START, '[color=33b3e6]').replace(HIGHLIGHT_END, '[/color]')
+
+    def on_release(self):
+        self.screen.show_title(self.title_id)
+
+
+class ComicListWidget(RecycleDataViewBehavior, BoxLayout):
+    """ Recyclable row of the home screen's title list, bound to a title record (TitleRow) """
 
     title_label = ObjectProperty()
     dropdown = ObjectProperty()
 
     title = StringProperty()
     progress = StringProperty()
-    owned_issues = ''
-    notes = StringProperty()
-    issue_notes = DictProperty()
 
-    data = DictProperty()
+    # title record currently displayed by this row, its fields are read from it when a dropdown opens
+    record = None
 
-    def __init__(self, title, publisher, volume, format_, standard_issues, odd_issues, owned_issues,
-                 other_editions, start_date, end_date, group, notes, issue_notes, **kwargs):
-        super(ComicListWidget, self).__init__(**kwargs)
-        self.title = title
-        self.publisher = publisher
-        self.volume = volume
-        self.format = format_
-        self.standard_issues = standard_issues
-        self.odd_issues = odd_issues
-        self.owned_issues = owned_issues
-        self.other_editions = other_editions
-        self.start_date = start_date
-        self.end_date = end_date
-        self.group = group
-        self.notes = notes
-        self.issue_notes = issue_notes
-
-        self.progress = self.get_progress()
-
-    def get_progress(self):
+    def refresh_view_attrs(self, rv, index, data):
+        """ Bind row to a new title record, reopening its dropdown if it was left open """
+        self.record = data
+        self.title = self.get_display_title(data)
+        self.progress = self.get_progress(data)
+
+        # recycled rows might still show the dropdown of a previous title
+        self.clear_dropdown()
+        if data.get('dropdown') == 'info':
+            self.show_info()
+        elif data.get('dropdown') == 'issues':
+            self.show_issues()
+
+    @staticmethod
+    def get_display_title(record):
+        """ Return title with volume number, marking inter company titles with '*' """
+        title = record['title']
+        if record['volume']:
+            title += " (Vol. {})".format(str(record['volume']))
+        if record['publishers']:
+            title += '*'
+        return title
+
+    @staticmethod
+    def get_progress(record):
         """ Return a percentage string of owned vs available comics """
-        if self.owned_issues != 'complete':
+        standard_issues = record['standard_issues']
+        if record['owned_issues'] != 'complete':
             # check if title is still ongoing
             ongoing = ('', '')
-            if isinstance(self.standard_issues, str):
-                total_issues = int(self.standard_issues[:-1])
+            if isinstance(standard_issues, str):
+                total_issues = int(standard_issues[:-1])
                 ongoing = ('+', '~')
-            elif isinstance(self.standard_issues, int):
+            elif isinstance(standard_issues, int):
                 # set total issue count
-                total_issues = self.standard_issues
+                total_issues = standard_issues
             else:
                 return '???'
-            if self.odd_issues:
+            if record['odd_issues']:
                 # add odd issues, if any
-                total_issues += len(self.odd_issues)
+                total_issues += len(record['odd_issues'])
             # set total owned issue count
-            owned_issues = len(self.owned_issues)
+            owned_issues = len(record['owned_issues'])
             # return percentage
             return "{}/{}{} ({}{:.1%})".format(owned_issues, total_issues,
                                                ongoing[0], ongoing[1], owned_issues/total_issues)
 
-        return self.owned_issues
+        return record['owned_issues']
 
     def clear_dropdown(self):
         """ Clear any content in dropdown section """
+        self.title_label.color = (.6, .6, .6, 1)
         self.dropdown.clear_widgets()
 
-    def get_date_string(self):
-        if self.start_date:
-            dates = self.start_date
-            if self.end_date:
-                dates += " - {}".format(self.end_date)
+    @staticmethod
+    def get_date_string(record):
+        if record['start_date']:
+            dates = record['start_date']
+            if record['end_date']:
+                dates += " - {}".format(record['end_date'])
             return dates
         return ''
 
@@ -511,38 +682,50 @@ class ComicListWidget(BoxLayout):
 
         # this acts as a toggle btn, clearing if anything is available...
         if self.dropdown.children:
-            self.title_label.color = (.6, .6, .6, 1)
+            self.record['dropdown'] = None
             self.clear_dropdown()
         # ...or adding content if dropdown is empty
         else:
-            dates = self.get_date_string()
+            self.record['dropdown'] = 'info'
+            self.show_info()
+
+    def show_info(self):
+        """ Add title information to dropdown """
 
-            self.title_label.color = (1, 1, 1, 1)
+        record = self.record
+        dates = self.get_date_string(record)
 
-            self.dropdown.add_widget(InfoDropDownContent(self.publisher, self.standard_issues, dates,
-                                                         self.notes, self.issue_notes))
+        self.title_label.color = (1, 1, 1, 1)
+
+        self.dropdown.add_widget(InfoDropDownContent(record['publishers'] or record['publisher'],
+                                                     record['standard_issues'], dates,
+                                                     record['notes'], record['issue_notes']))
 
     def open_issues(self):
 
         if self.dropdown.children:
+            self.record['dropdown'] = None
             self.clear_dropdown()
 
         else:
-            issues_container = GridLayout(cols=10, size_hint_x=.5)
+            self.record['dropdown'] = 'issues'
+            self.show_issues()
 
-            std_issues = int()
+    def show_issues(self):
+        """ Add grid of owned issues to dropdown """
 
-            if isinstance(self.standard_issues, str):
-                if self.standard_issues.endswith('+'):
-                    std_issues = int(self.standard_issues[:-1])
-            else:
-                std_issues = self.standard_issues
+        std_issues = int()
+        standard_issues = self.record['standard_issues']
+        owned_issues = self.record['owned_issues']
 
-            for i in range(std_issues):
-                if i+1 in self.owned_issues:
-                    btn = ToggleButton(size_hint=(1, None), text=str(i+1), state='down')
-                else:
-                    btn = ToggleButton(size_hint=(1, None), text=str(i+1))
-                issues_container.add_widget(btn)
+        if isinstance(standard_issues, str):
+            if standard_issues.endswith('+'):
+                std_issues = int(standard_issues[:-1])
+        else:
+            std_issues = standard_issues
 
-            self.dropdown.add_widget(issues_container)
+        issues = range(1, std_issues + 1)
+        owned = issues if owned_issues == 'complete' else owned_issues
+        issues_container = IssueGrid(size_hint=(.5, None), readonly=True)
+        issues_container.show(list(issues), owned)
+        self.dropdown.add_widget(issues_container)
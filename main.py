@@ -1,12 +1,22 @@
 from kivy.app import App
 from kivy.config import Config
-from kivy.properties import ObjectProperty
+from kivy.clock import mainthread
+from kivy.properties import NumericProperty, ObjectProperty
 from kivy.uix.screenmanager import ScreenManager
 
 from os.path import isfile
-from sqlite3 import connect, Error
+from sqlite3 import Error
 from datetime import datetime
-
+from json import loads
+
+from comics_collation import rebuild_sort_keys
+from comics_database import ConnectionManager, DatabaseExecutor
+from comics_groups import GroupChains
+from comics_issues import encode_other_editions, encode_owned_issues
+from comics_search import create_search_index, rebuild_search_index
+from comics_queries import TITLE_FIELDS
+from comics_suggestions import SuggestionIndex, SuggestionService
+from screen_groups import ScreenGroups
 from screen_home import ScreenHome
 from screen_new import ScreenNew
 
@@ -24,24 +34,68 @@ class ComicsApp(App):
 
     # database
     db_path = 'database/ComicsDatabase.db'
+    # connections of every thread. conn is the writer, queries are the UI thread's read only queries
+    database = ObjectProperty()
     conn = ObjectProperty()
+    queries = ObjectProperty()
+    # runs writes and slow reads off the UI thread, and the number of its jobs still pending
+    jobs = ObjectProperty()
+    pending_jobs = NumericProperty(0)
+    # cached group lookups and chains
+    groups = ObjectProperty()
+    # suggestions for publisher, format and group text inputs
+    suggestions = ObjectProperty()
+    # schema version, stored in the database's user_version pragma
+    db_version = 8
 
     comic_publishers = ('Marvel', 'DC', 'Dark Horse', 'Image')
 
+    # TITLES fields shared with the old per publisher and InterCompany tables
+    title_fields = TITLE_FIELDS[1:]
+
     # add screen manager and load first page
     pages = ScreenManager()
 
     def build(self):
         self.title = 'Holger\'s Comic Collection'
         self.create_comics_database()
+        self.load_suggestions()
         # self.pages.add_widget(ScreenHome(name='screen_home'))
         self.pages.add_widget(ScreenNew(name='screen_new'))
         return self.pages
 
+    def on_stop(self):
+        """ Report statement usage and suggestion stats when closing the app """
+        # titles still queued in batch entry mode get written before the database is closed
+        if self.pages.has_screen('screen_new'):
+            self.pages.get_screen('screen_new').write_batch()
+        self.database.print_execution_counts()
+        self.suggestions.print_stats()
+        self.suggestions.shutdown()
+        self.jobs.shutdown()
+        self.database.close()
+
     def db_cursor(self):
         """ Return database cursor """
         return self.conn.cursor()
 
+    def connect_database(self):
+        """ Open database connections and prepare named statements """
+        self.database = ConnectionManager(self.db_path)
+        # creating and migrating the database writes on the UI thread, before any job can run
+        self.conn = self.database.writer
+        self.queries = self.database.reader()
+        self.groups = GroupChains(self.queries)
+        self.jobs = DatabaseExecutor(self.database, on_pending=lambda pending: setattr(self, 'pending_jobs', pending))
+
+    def load_suggestions(self):
+        """ Load publisher, format and group names into suggestion indices """
+        indices = {}
+        for field in ('publisher', 'format', 'group'):
+            names = self.queries.execute(field + '_names').fetchall()
+            indices[field] = SuggestionIndex(n[0] for n in names)
+        self.suggestions = SuggestionService(indices)
+
     def switch_screen(self, screen_name):
         """ Switch to screen """
         # check if given screen already being displayed
@@ -53,6 +107,8 @@ class ComicsApp(App):
                     self.pages.add_widget(ScreenHome(name='screen_home'))
                 elif screen_name == 'screen_new':
                     self.pages.add_widget(ScreenNew(name='screen_new'))
+                elif screen_name == 'screen_groups':
+                    self.pages.add_widget(ScreenGroups(name='screen_groups'))
             # switch to screen
             self.pages.current = screen_name
 
@@ -63,18 +119,21 @@ class ComicsApp(App):
         if not isfile(self.db_path): # check whether database file exists and create if necessary
             try:
                 print('Creating {} file'.format(self.db_path))
-                self.conn = connect(self.db_path)
+                self.connect_database()
                 cur = self.db_cursor()
 
                 self.create_settings_table(cur)
                 self.create_formats_table(cur)
                 self.create_publishers_table(cur)
-                self.create_inter_company_table(cur)
                 self.create_groups_table(cur)
+                self.create_titles_table(cur)
+                self.create_title_publishers_table(cur)
 
                 for p in self.comic_publishers:
-                    self.create_publisher_table(cur, p)
+                    self.add_publisher(self.database.writer_queries, cur, p)
 
+                # newly created tables match schema version 1, later changes are applied by migrate_database
+                cur.execute("PRAGMA user_version = 1")
                 print('{} creation complete'.format(self.db_path.split('/')[-1].split('.')[0]))
                 self.conn.commit()
 
@@ -83,9 +142,158 @@ class ComicsApp(App):
                 self.conn.rollback()
         else:
             print('Database exists at \'{}\''.format(self.db_path))
-            self.conn = connect(self.db_path)
+            self.connect_database()
+        self.migrate_database()
         print(datetime.now() - start)
 
+    def migrate_database(self):
+        """ Bring an existing database up to date with the current schema """
+
+        cur = self.db_cursor()
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.db_version:
+            return
+
+        try:
+            # run all migration steps in a single transaction
+            cur.execute("BEGIN")
+            if version < 1:
+                self.migrate_publisher_tables(cur)
+            if version < 2:
+                self.add_title_versions(cur)
+            if version < 3:
+                self.encode_owned_issues(cur)
+            if version < 4:
+                self.add_group_indices(cur)
+            if version < 5:
+                self.add_title_grouping_index(cur)
+            if version < 6:
+                create_search_index(cur)
+                rebuild_search_index(cur)
+            if version < 7:
+                self.add_title_sort_keys(cur)
+            if version < 8:
+                self.collate_title_sort_keys(cur)
+
+            cur.execute("PRAGMA user_version = {}".format(self.db_version))
+            self.conn.commit()
+            print('Database migrated from version {} to {}'.format(version, self.db_version))
+
+        except Error:
+            print('ERROR, rolling back database migration')
+            self.conn.rollback()
+            raise
+
+    def migrate_publisher_tables(self, db_cursor):
+        """ Move titles from per publisher tables and InterCompany into TITLES """
+
+        self.create_titles_table(db_cursor)
+        self.create_title_publishers_table(db_cursor)
+
+        tables = {t[0] for t in db_cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        fields = ', '.join(self.title_fields)
+
+        # copy each publisher's table over in one statement, then drop it
+        for p_id, publisher in db_cursor.execute("SELECT id, publisher FROM PUBLISHERS").fetchall():
+            table = ScreenHome.get_publisher_table_name(publisher)
+            if table in tables:
+                db_cursor.execute("INSERT INTO TITLES (publisher_id, {0}) SELECT ?, {0} FROM '{1}'".format(fields, table),
+                                  (p_id,))
+                db_cursor.execute("DROP TABLE '{}'".format(table))
+                print("Titles of {} moved to TITLES table".format(publisher))
+
+        # inter company cross overs have no single publisher, link them through TITLE_PUBLISHERS instead
+        if 'InterCompany' in tables:
+            queries = self.database.writer_queries
+            for row in db_cursor.execute("SELECT publishers, {} FROM InterCompany".format(fields)).fetchall():
+                queries.execute('insert_title', dict(zip(TITLE_FIELDS, (None,) + row[1:])), db_cursor)
+                self.add_title_publishers(queries, db_cursor, db_cursor.lastrowid, loads(row[0]))
+            db_cursor.execute("DROP TABLE InterCompany")
+            print("InterCompany titles moved to TITLES table")
+
+    @staticmethod
+    def add_title_versions(db_cursor):
+        """ Add row_version to TITLES, so screens can fetch only titles changed since they last loaded
+
+            Triggers set row_version of every inserted or changed title to one above the current highest version.
+        """
+
+        db_cursor.execute("ALTER TABLE TITLES ADD COLUMN 'row_version' INTEGER NOT NULL DEFAULT 0")
+        db_cursor.execute("UPDATE TITLES SET row_version = 1")
+        db_cursor.execute("CREATE INDEX 'titles_row_version' ON TITLES(row_version)")
+
+        next_version = "(SELECT max(row_version) + 1 FROM TITLES)"
+        db_cursor.execute("""CREATE TRIGGER 'titles_insert_version' AFTER INSERT ON TITLES
+                          BEGIN UPDATE TITLES SET row_version = {} WHERE id = new.id; END""".format(next_version))
+        db_cursor.execute("""CREATE TRIGGER 'titles_update_version' AFTER UPDATE OF {} ON TITLES
+                          BEGIN UPDATE TITLES SET row_version = {} WHERE id = new.id; END""".format(
+                          ', '.join(TITLE_FIELDS), next_version))
+        # linking a cross over to its publishers changes the title's publishers
+        db_cursor.execute("""CREATE TRIGGER 'title_publishers_insert_version' AFTER INSERT ON TITLE_PUBLISHERS
+                          BEGIN UPDATE TITLES SET row_version = {} WHERE id = new.title_id; END""".format(next_version))
+        print("row_version added to TITLES table")
+
+    def encode_owned_issues(self, db_cursor):
+        """ Re-encode owned issues stored as JSON lists into the compact OwnedIssues format, of titles and of their
+            other editions
+        """
+
+        self.conn.create_function('encode_owned_issues', 1, encode_owned_issues)
+        db_cursor.execute("UPDATE TITLES SET owned_issues = encode_owned_issues(owned_issues) "
+                          "WHERE owned_issues LIKE '[%'")
+        print("Owned issues of {} titles re-encoded".format(db_cursor.rowcount))
+
+        # owned issues of other editions are nested in their JSON
+        self.conn.create_function('encode_other_editions', 1, encode_other_editions)
+        db_cursor.execute("UPDATE TITLES SET other_editions = encode_other_editions(other_editions) "
+                          "WHERE other_editions LIKE '%\"owned_issues\": [%'")
+        print("Owned issues of other editions of {} titles re-encoded".format(db_cursor.rowcount))
+
+    @staticmethod
+    def add_group_indices(db_cursor):
+        """ Index GROUPS by case insensitive name and by parent, for name lookups and walking down the tree """
+
+        db_cursor.execute("CREATE INDEX IF NOT EXISTS 'groups_name_nocase' ON GROUPS(name COLLATE NOCASE)")
+        db_cursor.execute("CREATE INDEX IF NOT EXISTS 'groups_parent' ON GROUPS(parent)")
+        print("GROUPS indices created")
+
+    @staticmethod
+    def add_title_grouping_index(db_cursor):
+        """ Index TITLES by group, for counting the titles of a group """
+
+        db_cursor.execute("CREATE INDEX IF NOT EXISTS 'titles_grouping' ON TITLES(grouping)")
+        print("TITLES grouping index created")
+
+    @staticmethod
+    def add_title_sort_keys(db_cursor):
+        """ Add sort_key to TITLES, the normalized title the home screen sorts and filters titles by
+
+            Triggers keep it up to date using the title_sort_key function, registered on every connection.
+        """
+        db_cursor.execute("ALTER TABLE TITLES ADD COLUMN 'sort_key' TEXT")
+        db_cursor.execute("UPDATE TITLES SET sort_key = title_sort_key(title)")
+        db_cursor.execute("CREATE INDEX 'titles_sort_key' ON TITLES(sort_key)")
+
+        update = "UPDATE TITLES SET sort_key = title_sort_key(new.title) WHERE id = new.id"
+        db_cursor.execute("""CREATE TRIGGER 'titles_insert_sort_key' AFTER INSERT ON TITLES
+                          BEGIN {}; END""".format(update))
+        db_cursor.execute("""CREATE TRIGGER 'titles_update_sort_key' AFTER UPDATE OF title ON TITLES
+                          BEGIN {}; END""".format(update))
+        print("sort_key added to TITLES table")
+
+    @staticmethod
+    def collate_title_sort_keys(db_cursor):
+        """ Recompute sort keys with the collation of comics_collation, which includes the volume of a title """
+
+        db_cursor.execute("DROP TRIGGER IF EXISTS 'titles_insert_sort_key'")
+        db_cursor.execute("DROP TRIGGER IF EXISTS 'titles_update_sort_key'")
+        update = "UPDATE TITLES SET sort_key = title_sort_key(new.title, new.volume) WHERE id = new.id"
+        db_cursor.execute("""CREATE TRIGGER 'titles_insert_sort_key' AFTER INSERT ON TITLES
+                          BEGIN {}; END""".format(update))
+        db_cursor.execute("""CREATE TRIGGER 'titles_update_sort_key' AFTER UPDATE OF title, volume ON TITLES
+                          BEGIN {}; END""".format(update))
+        rebuild_sort_keys(db_cursor)
+
     @staticmethod
     def create_formats_table(db_cursor):
         """ Create FORMATS table """
@@ -105,27 +313,6 @@ class ComicsApp(App):
                           'parent' INTEGER)""")
         print("GROUPS table created")
 
-    @staticmethod
-    def create_inter_company_table(db_cursor):
-        """ Create table for inter company cross overs"""
-
-        db_cursor.execute("""CREATE TABLE 'InterCompany'(
-                          'id' INTEGER NOT NULL PRIMARY KEY,
-                          'publishers' TEXT NOT NULL,
-                          'title' TEXT NOT NULL,
-                          'volume' TEXT,
-                          'format' TEXT, 
-                          'standard_issues' INTEGER NOT NULL,
-                          'odd_issues' TEXT,
-                          'owned_issues' TEXT NOT NULL,
-                          'other_editions' TEXT,
-                          'start_date' TEXT,
-                          'end_date' TEXT,
-                          'grouping' TEXT,
-                          'notes' TEXT,
-                          'issue_notes' TEXT)""")
-        print("InterCompany table created")
-
     @staticmethod
     def create_publishers_table(db_cursor):
         """ Create table to hold publishers """
@@ -136,51 +323,88 @@ class ComicsApp(App):
         print("PUBLISHERS table created")
 
 
+    def add_publisher(self, queries, db_cursor, publisher):
+        """ Add publisher to PUBLISHERS table and return its id, queries being those of the writer """
+
+        queries.execute('insert_publisher', (publisher,), db_cursor)
+        self.database.after_commit(lambda: self.name_added('publisher', publisher))
+        print("{} added to PUBLISHERS table".format(publisher))
+        return db_cursor.lastrowid
+
+    def add_format(self, queries, db_cursor, format_):
+        """ Add format to FORMATS table and return its id, queries being those of the writer """
+
+        queries.execute('insert_format', (format_,), db_cursor)
+        self.database.after_commit(lambda: self.name_added('format', format_))
+        print("{} added to FORMATS table".format(format_))
+        return db_cursor.lastrowid
+
     @staticmethod
-    def create_publisher_table(db_cursor, publisher):
-        """ Create single publisher table """
+    def create_settings_table(db_cursor):
+        """ Create settings table """
 
-        table = ScreenHome.get_publisher_table_name(publisher)
+        db_cursor.execute("""CREATE TABLE 'SETTINGS'(
+                          'last_backup' TEXT,
+                          'changes_since_backup' INTEGER)""")
+        print("SETTINGS table created")
 
-        # create table
-        db_cursor.execute("""CREATE TABLE IF NOT EXISTS '{}'(
+    @staticmethod
+    def create_titles_table(db_cursor):
+        """ Create table holding the titles of all publishers """
+
+        db_cursor.execute("""CREATE TABLE IF NOT EXISTS 'TITLES'(
                           'id' INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+                          'publisher_id' INTEGER REFERENCES PUBLISHERS(id),
                           'title' TEXT NOT NULL,
                           'volume' TEXT,
                           'format' INTEGER,
                           'standard_issues' INTEGER NOT NULL,
                           'odd_issues' TEXT,
                           'owned_issues' TEXT,
-                          'other_editions' TEXT, 
+                          'other_editions' TEXT,
                           'start_date' TEXT,
                           'end_date' TEXT,
                           'grouping' TEXT,
                           'notes' TEXT,
-                          'issue_notes' TEXT)""".format(table))
-        print("Publisher table for {} created".format(publisher), end=' -> ')
-
-        # add publisher to PUBLISHERS table
-        db_cursor.execute("INSERT INTO PUBLISHERS ('publisher') VALUES ('{}')".format(publisher))
-        print("{} added to PUBLISHERS table".format(publisher))
+                          'issue_notes' TEXT)""")
+        db_cursor.execute("CREATE INDEX IF NOT EXISTS 'titles_publisher_id' ON TITLES(publisher_id)")
+        db_cursor.execute("CREATE INDEX IF NOT EXISTS 'titles_title' ON TITLES(title)")
+        print("TITLES table created")
 
     @staticmethod
-    def create_settings_table(db_cursor):
-        """ Create settings table """
+    def create_title_publishers_table(db_cursor):
+        """ Create table linking inter company cross overs to their publishers """
 
-        db_cursor.execute("""CREATE TABLE 'SETTINGS'(
-                          'last_backup' TEXT,
-                          'changes_since_backup' INTEGER)""")
-        print("SETTINGS table created")
+        db_cursor.execute("""CREATE TABLE IF NOT EXISTS 'TITLE_PUBLISHERS'(
+                          'title_id' INTEGER NOT NULL REFERENCES TITLES(id),
+                          'publisher_id' INTEGER NOT NULL REFERENCES PUBLISHERS(id),
+                          PRIMARY KEY ('title_id', 'publisher_id')) WITHOUT ROWID""")
+        db_cursor.execute("""CREATE INDEX IF NOT EXISTS 'title_publishers_publisher_id'
+                          ON TITLE_PUBLISHERS(publisher_id)""")
+        print("TITLE_PUBLISHERS table created")
+
+    def add_title_publishers(self, queries, db_cursor, title_id, publisher_ids):
+        """ Link an inter company cross over title to each of its publishers, queries being those of the writer """
 
-    def add_new_group(self, db_cursor, group_name, parent_id=None):
+        queries.executemany('insert_title_publisher', [(title_id, p_id) for p_id in publisher_ids], db_cursor)
 
-        sql = "INSERT INTO GROUPS (name, parent) VALUES ('{}', ".format(group_name)
-        sql += "{})".format(parent_id) if parent_id else "NULL)"
-        print(sql)
+    def add_new_group(self, queries, db_cursor, group_name, parent_id=None):
 
-        db_cursor.execute(sql)
+        queries.execute('insert_group', (group_name, parent_id), db_cursor)
+        self.database.after_commit(lambda: self.name_added('group', group_name))
+        print("{} added to GROUPS table".format(group_name))
         return db_cursor.lastrowid
 
+    @mainthread
+    def name_added(self, field, name):
+        """ Suggest a publisher, format or group name once it's committed to the database, on the main thread
+            whichever thread added it
+        """
+        if field == 'group':
+            self.groups.invalidate()
+        if self.suggestions:
+            self.suggestions.add(field, name)
+
 
 if __name__ == '__main__':
     ComicsApp().run()
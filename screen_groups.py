@@ -0,0 +1,51 @@
+from kivy.app import App
+from kivy.lang import Builder
+from kivy.properties import ObjectProperty
+
+from comics_widgets import ComicsScreen, GroupTreeNode
+
+Builder.load_file('screen_groups.kv')
+
+
+class ScreenGroups(ComicsScreen):
+    """ Screen to browse titles by group, loading a group's children only once it gets expanded """
+
+    groups_tree = ObjectProperty()
+    status_bar = ObjectProperty()
+
+    # (titles version, number of groups) the tree was loaded at, None before the first load
+    loaded_version = None
+
+    def prepare_screen(self, app):
+        """ Reload the tree if titles or groups changed since it was loaded """
+
+        if self.loaded_version is None or self.get_version(app.queries) == self.loaded_version:
+            return
+
+        tree = self.groups_tree
+        for node in list(tree.root.nodes):
+            tree.remove_node(node)
+        for node in self.load_group_nodes(tree, None):
+            tree.add_node(node)
+
+    @staticmethod
+    def get_version(queries):
+        """ Return what the tree's counts depend on """
+        return (queries.execute('titles_version').fetchone()[0],
+                queries.execute('groups_count').fetchone()[0])
+
+    def load_group_nodes(self, tree, node):
+        """ Yield nodes of the groups below node, or of the top level groups if node is None
+
+            Called by the tree whenever a node is expanded for the first time. The counts of all children come from a
+            single aggregate query.
+        """
+
+        queries = App.get_running_app().queries
+        if node is None:
+            self.loaded_version = self.get_version(queries)
+        parent = node.group_id if node else None
+
+        for group_id, name, has_children, titles, owned, total in queries.execute('group_children_counts', (parent,)):
+            yield GroupTreeNode(group_id=group_id, name=name, titles=titles, owned=owned, total=total,
+                                is_leaf=not has_children)
@@ -1,9 +1,17 @@
+from kivy.app import App
+from kivy.clock import Clock
 from kivy.lang import Builder
-from kivy.properties import DictProperty, ListProperty, ObjectProperty
+from kivy.properties import BooleanProperty, NumericProperty, ObjectProperty
 
+from bisect import bisect_left
 from json import loads
+from time import perf_counter
 
-from comics_widgets import ComicListWidget, ComicsScreen
+from comics_issues import decode_owned_issues
+from comics_collation import COLLATION
+from comics_search import match_expression, search_titles
+from comics_titles import TitleRow
+from comics_widgets import ComicsScreen
 
 Builder.load_file('screen_home.kv')
 
@@ -12,83 +20,176 @@ class ScreenHome(ComicsScreen):
     """ Screen to allow user to add a comic title, and relative information. """
 
     titles_container = ObjectProperty()
+    search_input = ObjectProperty()
+    filter_input = ObjectProperty()
+    search_results = ObjectProperty()
     status_bar = ObjectProperty()
 
-    # list of dicts containing publisher id and name in PUBLISHERS table of database
-    publishers = DictProperty()
+    # whether search results are shown instead of the title list
+    searching = BooleanProperty(False)
 
-    # database field names for each publishers and inter-company crossovers
-    publisher_keys = ListProperty()
-    inter_keys = ListProperty()
+    # highest TITLES.row_version shown, 0 if nothing has been loaded yet
+    loaded_version = NumericProperty(0)
 
-    def prepare_screen(self, cur):
-        """ Set up class """
+    # titles fetched per page, and how close (in list heights) to its end the list gets before fetching the next page
+    page_size = 100
+    page_ahead = 1
 
-        self.publishers = self.set_publishers(cur)
-        self.publisher_keys = self.get_table_fields(cur, self.publishers[1])
-        self.inter_keys = self.get_table_fields(cur, 'InterCompany')
+    def __init__(self, **kwargs):
+        super(ScreenHome, self).__init__(**kwargs)
+        # (sort_key, id) of, and lookup by id into, the listed titles, for patching changes in place
+        self.title_keys = []
+        self.titles_by_id = {}
+        # sort key prefix of listed titles, '' to list all titles, and the text it was typed as
+        self.title_filter = ''
+        self.filter_text = ''
+        # (sort_key, id) of the last listed title, None once every matching title is listed
+        self.page_end = None
+        # incremented whenever the list starts over, pages still loading for an earlier list get dropped
+        self.list_generation = 0
+        # whether a page is being loaded on the database thread, and whether it starts the list over
+        self.page_pending = False
+        self.page_first = False
+        # whether leaving the screen dropped the page being loaded, see on_pre_leave
+        self.page_dropped = False
+        # incremented with every search, searches still waiting for the database thread for an earlier one get dropped
+        self.search_generation = 0
+        # id of title to scroll to and open once it is listed, see show_title
+        self.title_to_show = None
 
-        titles = self.load_all_titles(cur)
-        self.show_titles(titles)
+    def prepare_screen(self, app):
+        """ Set up class, only loading titles that changed since the screen was last shown """
+        app.jobs.read(self.load_changes, self.loaded_version, callback=lambda changes: self.apply_changes(app, *changes))
+        if self.searching:
+            # titles may have changed, or the search was dropped when the screen was left
+            self.show_search_results(app, self.search_input.text)
 
-    @staticmethod
-    def set_publishers(cur):
-        """ Return dictionary of publishers
-            1: 'publisher1'
-            2: 'publisher2'
+    def on_pre_leave(self, *args):
+        """ Drop pages and searches still waiting for the database thread, so writes submitted on other screens
+            don't queue up behind them. A dropped page is loaded again once the screen is shown again.
         """
-        return {p[0]: p[1] for p in cur.execute("SELECT id, publisher FROM PUBLISHERS").fetchall()}
+        self.list_generation += 1
+        self.search_generation += 1
+        if self.page_pending:
+            self.page_pending = False
+            self.page_dropped = True
 
-    @staticmethod
-    def get_table_fields(cur, table_name):
-        """ Return list of fields (column names) of specified table """
-        cur.execute("SELECT * FROM {}".format(table_name)).fetchone()
-        return list(map(lambda a: a[0], cur.description))
-
-    def load_all_titles(self, cur):
-        """ Return sorted list of all titles by all publishers """
-        titles = []
-        # get titles from publishers
-        for p_id in self.publishers:
-            titles += self.get_publisher_titles(cur, p_id)
-        # get titles from inter company cross overs
-        titles += self.get_inter_company_titles(cur)
-
-        return self.sort_ignore_prefix(titles)
-
-    def get_publisher_titles(self, cur, p_id):
-        """ Return a list of titles [dict] by publisher """
-        # set table name
-        publisher = self.publishers[p_id]
-        table = self.get_publisher_table_name(publisher)
-        # get titles from db
-        titles = cur.execute("SELECT * FROM {}".format(table)).fetchall()
-        titles = self.cleanup_titles(titles, self.publisher_keys)
-        # add publisher field
-        # TODO this was just a quick fix, refactor and create cleaner code
-        for title in titles:
-            title['publisher'] = publisher
+    def load_changes(self, queries, since_version):
+        """ Return current titles version, and the titles changed after since_version, None if nothing was loaded yet
+            or nothing changed, as database job
+        """
+        version = queries.execute('titles_version').fetchone()[0]
+        if not since_version or version == since_version:
+            return version, None
+        return version, self.load_changed_titles(queries, since_version)
 
-        return titles
+    def apply_changes(self, app, version, titles):
+        """ List the first page on the first visit, later on patch changed titles into the list """
+        dropped, self.page_dropped = self.page_dropped, False
+        if not self.loaded_version or dropped and self.page_first:
+            self.show_first_page(app)
+        else:
+            if titles:
+                self.update_titles(titles)
+            if dropped:
+                self.show_next_page(app)
+        self.loaded_version = version
 
-    def get_inter_company_titles(self, cur):
-        """ Return a list of inter company cross over titles """
-        titles = cur.execute("SELECT * FROM InterCompany").fetchall()
-        return self.cleanup_titles(titles, self.inter_keys)
+    def load_page(self, queries, title_filter='', after=None, generation=None):
+        """ Return the page of titles starting with title_filter that follows (sort_key, id) after, from the first if
+            None
 
-    def cleanup_titles(self, titles, keys):
-        """ Zip dictionary and jsonify dicts and lists from database """
-        titles = [self.zip_titles(t, keys) for t in titles]
-        titles = self.json_loads_dict(titles)
-        titles = self.set_none_values(titles)
-        return titles
+            As database job requested for the list of generation, returns None without reading any titles if the list
+            started over or the screen was left since.
+        """
+        if generation is not None and generation != self.list_generation:
+            return None
+        return TitleRow.from_cursor(queries.titles_page(title_filter, after, self.page_size))
 
-    @staticmethod
-    def zip_titles(sql_tuple, keys):
-        """ Return a dictionary zipped from list of keys and sql tuples"""
-        return dict(zip(keys, sql_tuple))
+    def show_first_page(self, app):
+        """ Start the list over with the first page of titles matching the filter, once it is loaded """
+        self.list_generation += 1
+        self.request_page(app, None)
+
+    def show_next_page(self, app):
+        """ Load the next page of titles to append to the list, if there are more and none is loading already """
+        if self.page_end is not None and not self.page_pending:
+            self.request_page(app, self.page_end)
+
+    def request_page(self, app, after):
+        """ Load the page following after on the database thread, listing it once loaded """
+        generation = self.list_generation
+        self.page_pending = True
+        self.page_first = after is None
+        app.jobs.read(self.load_page, self.title_filter, after, generation,
+                      callback=lambda titles: self.list_page(app, titles, generation, after is None),
+                      error_callback=lambda error: self.page_failed(generation, error))
+
+    def list_page(self, app, titles, generation, first):
+        """ Show a loaded page, unless the list started over while it was loading """
+        if generation != self.list_generation:
+            return
+        self.page_pending = False
+
+        if first:
+            self.title_keys = [self.list_key(t) for t in titles]
+            self.titles_by_id = {t['id']: t for t in titles}
+            self.titles_container.data = titles
+            self.titles_container.scroll_y = 1
+        else:
+            self.title_keys += [self.list_key(t) for t in titles]
+            self.titles_by_id.update((t['id'], t) for t in titles)
+            self.titles_container.data.extend(titles)
+        self.set_page_end(titles)
+
+        if first and not self.searching:
+            self.show_filter_status()
+        if self.title_to_show is not None:
+            self.reveal_title(app)
+
+    def page_failed(self, generation, error):
+        """ Report a page that couldn't be loaded, allowing the next scroll to try again """
+        if generation == self.list_generation:
+            self.page_pending = False
+            self.status_bar.set_status("Titles could not be loaded ({})".format(error), 'error')
 
-    def json_loads_dict(self, titles_list):
+    def set_page_end(self, titles):
+        """ Remember where the next page starts, a page shorter than page_size is the last one """
+        self.page_end = self.list_key(titles[-1]) if len(titles) == self.page_size else None
+
+    def list_key(self, title):
+        """ Return (sort_key, id) of title, which orders the list like pages are ordered """
+        return self.title_sort_key(title), title['id']
+
+    def on_titles_scroll(self, app, rv):
+        """ Fetch the next page once the list is scrolled close to its end """
+        if self.page_end is None or not rv.children:
+            return
+        below = rv.scroll_y * (rv.children[0].height - rv.height)
+        if below < self.page_ahead * rv.height:
+            self.show_next_page(app)
+
+    def filter_titles(self, app, text):
+        """ Narrow the list to titles starting with text, on every keystroke, with an indexed range query """
+        self.title_filter = COLLATION.prefix_key(text)
+        self.filter_text = text.strip()
+        self.show_first_page(app)
+
+    def show_filter_status(self):
+        """ Show how many titles start with the filter text """
+        if self.title_filter:
+            more = '' if self.page_end is None else '+'
+            self.status_bar.set_status("{}{} titles start with '{}'".format(
+                                       len(self.titles_container.data), more, self.filter_text), 'normal')
+        else:
+            self.status_bar.set_status("This is a list of all comics in database")
+
+    def load_changed_titles(self, queries, since_version):
+        """ Return list of titles inserted or changed after since_version """
+        return TitleRow.from_cursor(queries.execute('titles_since', (since_version,)))
+
+    @staticmethod
+    def json_loads_dict(titles_list):
         """ json.loads all fields where possible and return jsonified dict """
 
         json_fields = ['odd_issues', 'other_editions', 'issue_notes']
@@ -99,64 +200,135 @@ class ScreenHome(ComicsScreen):
                         title[field] = loads(title[field])
                 except KeyError:
                     pass
-            if title['owned_issues'] != 'complete':
-                title['owned_issues'] = loads(title['owned_issues'])
-            # set publishers
-            if 'publishers' in title:
-                # create string from list of publishers
-                title['publishers'] = ', '.join(sorted(self.publishers[i] for i in loads(title['publishers'])))
+            title['owned_issues'] = decode_owned_issues(title['owned_issues'])
+            # sort inter company publishers, as group_concat doesn't guarantee any order
+            if title.get('publishers'):
+                title['publishers'] = ', '.join(sorted(title['publishers'].split(', ')))
         return titles_list
 
-    @staticmethod
-    def set_none_values(titles):
-        """ Return appropriate (empty) data types from db NULL entries """
+    def is_listed(self, key, title_id):
+        """ Return whether a title with sort key and id belongs to the listed titles, pages not fetched yet excluded
+
+            Pages continue after the (sort_key, id) of the last listed title, so titles sharing its sort key are only
+            listed up to its id.
+        """
+        if not key.startswith(self.title_filter):
+            return False
+        return self.page_end is None or (key, title_id) <= self.page_end
+
+    def update_titles(self, titles):
+        """ Patch changed titles into the list, inserting new ones at their sorted position
+
+            Titles sorting after the last fetched page are left to the page that will fetch them.
+        """
+
+        data = self.titles_container.data
         for title in titles:
-            if not title['notes']:
-                title['notes'] = ''
-            if not title['issue_notes']:
-                title['issue_notes'] = {}
-        return titles
-
-    def show_titles(self, titles):
-        """ Load title widgets """
-
-        # clear widgets for a fresh reload
-        if self.titles_container.children:
-            self.titles_container.clear_widgets()
-
-        for t in titles:
-            # change title to reflect volume number
-            if t['volume']:
-                t['title'] += " (Vol. {})".format(str(t['volume']))
-            # append '*' to inter company titles
-            if 'publishers' in t:
-                t['title'] += '*'
-                title_label = ComicListWidget(t['title'],
-                                              t['publishers'],
-                                              t['volume'],
-                                              t['format'],
-                                              t['standard_issues'],
-                                              t['odd_issues'],
-                                              t['owned_issues'],
-                                              t['other_editions'],
-                                              t['start_date'],
-                                              t['end_date'],
-                                              t['grouping'],
-                                              t['notes'],
-                                              t['issue_notes'])
+            key = self.list_key(title)
+            old = self.titles_by_id.pop(title['id'], None)
+
+            if old is not None:
+                # keep dropdown open
+                title['dropdown'] = old.get('dropdown')
+                i = self.find_title_index(old)
+                if self.title_keys[i] == key:
+                    # position stays the same, only the row showing it gets refreshed
+                    self.titles_by_id[title['id']] = title
+                    data[i] = title
+                    continue
+                del self.title_keys[i]
+                del data[i]
+
+            if self.is_listed(*key):
+                self.titles_by_id[title['id']] = title
+                i = bisect_left(self.title_keys, key)
+                self.title_keys.insert(i, key)
+                data.insert(i, title)
+
+    def find_title_index(self, title):
+        """ Return index of title in list, using bisection on the (sort_key, id) of the listed titles """
+        return bisect_left(self.title_keys, self.list_key(title))
+
+    def show_search_results(self, app, text):
+        """ Show the titles best matching text, or the title list again once text is cleared """
+
+        self.searching = match_expression(text) is not None
+        if not self.searching:
+            self.search_results.data = []
+            self.status_bar.set_status("This is a list of all comics in database")
+            return
+        self.search_generation += 1
+        app.jobs.read(self.search, text, self.search_generation,
+                      callback=lambda found: self.list_search_results(text, found))
+
+    def search(self, queries, text, generation):
+        """ Return titles best matching text and the seconds it took to find them, as database job
+
+            Returns None without searching if another search was started or the screen was left since.
+        """
+        if generation != self.search_generation:
+            return None
+        start = perf_counter()
+        results = search_titles(queries, text)
+        return results, perf_counter() - start
+
+    def list_search_results(self, text, found):
+        """ Show search results, unless the search was dropped or the search text changed while searching """
+        if found is None or not self.searching or text != self.search_input.text:
+            return
+        results, took = found
+        self.search_results.data = [{'title_id': title_id, 'title': title, 'snippet': snippet, 'screen': self}
+                                    for title_id, title, volume, snippet in results]
+        self.search_results.scroll_y = 1
+        self.status_bar.set_status("{} title{} found in {:.1f}ms".format(
+                                   len(results), '' if len(results) == 1 else 's', 1000 * took), 'normal')
+
+    def show_title(self, title_id):
+        """ Leave search results, filtering the title list by title and opening its info """
+        app = App.get_running_app()
+        app.jobs.read(self.load_title_text, title_id, callback=lambda row: self.filter_by_title(app, title_id, row))
+
+    @staticmethod
+    def load_title_text(queries, title_id):
+        """ Return (title,) of title_id, None if it doesn't exist, as database job """
+        return queries.execute('title_text', (title_id,)).fetchone()
+
+    def filter_by_title(self, app, title_id, row):
+        """ Filter the title list by title, revealing the title once the list is loaded """
+        if row is None:
+            return
+        self.search_input.text = ''
+        self.title_to_show = title_id
+        # lists the title on the first page, unless a page or more of titles start with the same text
+        self.filter_input.text = row[0]
+        if not self.page_pending:
+            # the list was filtered by the same text already
+            self.reveal_title(app)
+
+    def reveal_title(self, app):
+        """ Scroll to and open title_to_show if it is listed, loading the next page if it isn't yet """
+
+        title = self.titles_by_id.get(self.title_to_show)
+        if title is None:
+            if self.page_end is None:
+                self.title_to_show = None
             else:
-                # TODO part of earlier quick fix. surely this can be shortened
-                title_label = ComicListWidget(t['title'],
-                                              t['publisher'],
-                                              t['volume'],
-                                              t['format'],
-                                              t['standard_issues'],
-                                              t['odd_issues'],
-                                              t['owned_issues'],
-                                              t['other_editions'],
-                                              t['start_date'],
-                                              t['end_date'],
-                                              t['grouping'],
-                                              t['notes'],
-                                              t['issue_notes'])
-            self.titles_container.add_widget(title_label)
+                self.show_next_page(app)
+            return
+        self.title_to_show = None
+
+        rv = self.titles_container
+        i = self.find_title_index(title)
+
+        # scroll title to the top of the list first, assuming rows above it have the average row height
+        content = rv.children[0].height
+        scrollable = content - rv.height
+        if scrollable > 0:
+            rv.scroll_y = max(0, min(1, 1 - i * content / len(rv.data) / scrollable))
+
+        def open_info(dt):
+            """ Open the title's info once the list has been laid out at its new position """
+            title['dropdown'] = 'info'
+            rv.refresh_from_data()
+
+        Clock.schedule_once(open_info)
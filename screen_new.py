@@ -1,15 +1,24 @@
+from kivy.app import App
+from kivy.clock import Clock
 from kivy.lang import Builder
 from kivy.properties import BooleanProperty, DictProperty, ListProperty, NumericProperty, ObjectProperty, StringProperty
-from kivy.uix.label import Label
 
-from json import dumps
 from re import match
 
-from comics_widgets import AnnualsEditionBox, ComicsScreen, IssueNoteBox,\
-                           IssueToggleButton, OtherEditionBox, SpecialIssueNoteInputBox
+from comics_issues import OwnedIssues, convert_issue_number
+from comics_validation import collection_complete, excess_owned_issues, parse_standard_issues, split_odd_issues
+from comics_widgets import AnnualsEditionBox, ComicsScreen, IssueGrid, IssueNoteBox, OtherEditionBox,\
+                           SpecialIssueNoteInputBox
 
 Builder.load_file('screen_new.kv')
 
+# in batch entry mode, queued titles are written together once this many are queued, or this many seconds after the
+# first one was queued
+BATCH_SIZE = 10
+BATCH_SECONDS = 30
+# titles that could not be written are tried again after this many seconds, unless more get submitted before
+RETRY_SECONDS = 5
+
 
 class ScreenNew(ComicsScreen):
     """ Screen to allow user to add a comic title, and relative information. """
@@ -40,23 +49,43 @@ class ScreenNew(ComicsScreen):
 
     # user input
     publisher_count = NumericProperty(0)
-    standard_issues = ListProperty()
+    # range of standard issue numbers, so checking whether an issue is one of them is O(1)
+    standard_issues = ObjectProperty(range(0))
     issue_notes = DictProperty()
     special_issues = ListProperty()
 
     ongoing_series = BooleanProperty(False)
 
-    data = {'odd_issues': list(), 'owned_issues': list(), 'issue_notes': dict()}
+    data = {'odd_issues': list(), 'owned_issues': OwnedIssues(), 'issue_notes': dict()}
     other_editions_data = dict()
 
     # error handling
     errors = ListProperty()
 
+    # batch entry, submitted titles get queued and written in one transaction
+    batch_mode = BooleanProperty(False)
+    queued_titles = NumericProperty(0)
+
+    def __init__(self, **kwargs):
+        super(ScreenNew, self).__init__(**kwargs)
+        # rows currently shown in the special issues and issue notes panels, by issue
+        self.special_issue_boxes = {}
+        self.issue_note_boxes = {}
+        # (title, parameters, publisher_list, group_chain) of every title submitted and not written yet
+        self.batch = []
+        self.batch_trigger = Clock.create_trigger(self.write_batch, BATCH_SECONDS)
+        self.retry_trigger = Clock.create_trigger(self.write_batch, RETRY_SECONDS)
+
+    def on_batch_mode(self, instance, value):
+        """ Write titles still queued when batch entry is switched off """
+        if not value:
+            self.write_batch()
+
     def on_group_chain(self, instance, value):
         """ Update grouping text to show current selected group(s) """
         self.grouping_text = ' - '.join(value)
 
-    def set_grouping_info(self, cur, group_name_field):
+    def set_grouping_info(self, groups, group_name_field):
         """ Set grouping info list to represent grouping chain """
 
         # create a list text from group_name_field, before clearing it
@@ -67,90 +96,85 @@ class ScreenNew(ComicsScreen):
             # strip whitespace
             g = g.strip()
             # return (id, group_name, parent_id) if group exists in database
-            group_info = self.check_group_exists(cur, g)
+            group_info = self.check_group_exists(groups, g)
 
             if group_info:
                 # if group (g) exists, create group chain
-                self.group_chain = self.create_group_chain(cur, group_info)
+                self.group_chain = self.create_group_chain(groups, group_info)
 
             else:
                 # if group doesn't exist, append it to group chain
                 self.group_chain.append(g)
 
-    def check_group_exists(self, cur, group_name):
+    def check_group_exists(self, groups, group_name):
         """ Check whether entered group name exists in data base """
-        # check database for group and return result
-        return cur.execute("SELECT * FROM GROUPS WHERE name IS '{}' COLLATE NOCASE".format(group_name)).fetchone()
-
-    def create_group_chain(self, cur, group_info):
-
-        # set group_name as group_chain's first value
-        group_chain = [group_info[1]]
-        # and set previous chain to current group's parent
-        prev_link = group_info[-1]
-
-        while prev_link:
-            # get current group's parent
-            parent_info = cur.execute("SELECT * FROM GROUPS WHERE id IS '{}'".format(prev_link)).fetchone()
-            # set prev_link to current parents' parent_id
-            prev_link = parent_info[-1]
-            # insert parent's name into beginning of group_tree list
-            group_chain.insert(0, parent_info[1])
+        # check database (or cache) for group and return result
+        return groups.find(group_name, nocase=True)
 
-        return group_chain
+    def create_group_chain(self, groups, group_info):
+        """ Return names of group and all its parents, main group first """
+        return groups.chain_names(group_info[0])
 
     def on_special_issues(self, instance, value):
-
-        # clear special_notes_container
-        self.special_issue_notes.clear_widgets()
-
-        for i in self.special_issues:
-            try:
-                current_note = self.issue_notes[i]
-            except KeyError:
-                current_note = ''
-            special = SpecialIssueNoteInputBox(instance, self.special_issue_notes, i, current_note, self.issue_note_container, self.status_bar)
-            self.special_issue_notes.add_widget(special)
+        """ Update special issue note inputs, only adding or removing the ones that changed """
+
+        boxes = self.special_issue_boxes
+        for i in set(boxes) - set(value):
+            self.special_issue_notes.remove_widget(boxes.pop(i))
+
+        for i in value:
+            if i not in boxes:
+                current_note = self.issue_notes.get(i, '')
+                boxes[i] = SpecialIssueNoteInputBox(instance, self.special_issue_notes, i, current_note,
+                                                    self.issue_note_container, self.status_bar)
+                self.special_issue_notes.add_widget(boxes[i])
+
+        # put inputs back in order, if new special issues ended up between existing ones
+        ordered = [boxes[i] for i in value]
+        if self.special_issue_notes.children[::-1] != ordered:
+            self.special_issue_notes.clear_widgets()
+            for box in ordered:
+                self.special_issue_notes.add_widget(box)
 
     def on_issue_notes(self, instance, value):
-        """ Update displayed notes """
-        self.issue_note_container.clear_widgets()
+        """ Update displayed notes, only adding or removing the notes that changed """
+
+        boxes = self.issue_note_boxes
+        for issue_number in set(boxes) - set(value):
+            self.issue_note_container.remove_widget(boxes.pop(issue_number))
+            self.data['issue_notes'].pop(issue_number, None)
 
         back_lit = True  # this will give every 2nd note a grey background
         for issue_number, issue_note in value.items():
             # alternate between backgrounds
             back_lit = True if not back_lit else False
-            # add issue note box to notes container
-            self.issue_note_container.add_widget(IssueNoteBox(issue_number, issue_note, self.issue_notes, back_lit))
+            box = boxes.get(issue_number)
+            if box is None:
+                # add issue note box to notes container
+                box = boxes[issue_number] = IssueNoteBox(issue_number, issue_note, self.issue_notes, back_lit)
+                self.issue_note_container.add_widget(box)
+            else:
+                box.issue_note_label.text = issue_note
+                box.back_lit = back_lit
             # add issue to data dict
             self.data['issue_notes'][issue_number] = issue_note.strip()
 
-    def populate_issue_container(self, container, issue_list):
-        """ Add issue buttons to issues container box """
-
-        # fill the first spots with blank, if necessary
-        # if issue_list == self.standard_issues and issue_list[0] != 1:
-        if issue_list == self.standard_issues:
+    def populate_issue_container(self, container, *issue_lists):
+        """ Show issues in issue grid container, every list of issues starting on a new row """
 
-            for i in range(issue_list[0]-1 % 10):
-                container.add_widget(Label(size_hint=(1, 1)))
+        cells = []
+        trailing_text = ''
+        for issue_list in issue_lists:
+            # start on a new row
+            cells += [None] * (-len(cells) % container.cols)
+            if issue_list is self.standard_issues:
+                # fill the first spots with blanks, so issues line up with their column
+                cells += [None] * ((issue_list[0] - 1) % container.cols)
+                if self.ongoing_series:
+                    trailing_text = '. . .'
+            cells += issue_list
 
-        for i in issue_list:
-            # create button
-            new_issue_toggle = IssueToggleButton(container, self.data, text=str(i))
-            # check whether it should be in a down state
-            if i in self.data['owned_issues']:
-                new_issue_toggle.state = 'down'
-            # add button to container
-            container.add_widget(new_issue_toggle)
-
-        if self.ongoing_series:
-            container.add_widget(Label(size_hint=(1, 1), text='. . .'))
-
-        # fill up empty space to make it took prettier
-        if len(issue_list) + int(self.ongoing_series) < 10:
-            for i in range(10 - len(issue_list) % 10):
-                container.add_widget(Label(size_hint=(1, 1)))
+        container.show(cells, self.data['owned_issues'], trailing_text)
 
     def load_standard_issues(self):
         """ Load standard issues based on what user entered """
@@ -164,29 +188,15 @@ class ScreenNew(ComicsScreen):
         if not issues:
             print('no issues')
             return False
-        elif match(r'^[1-9]\d*[+]$', issues):
-            # handle ongoing series
-            self.ongoing_series = True
-            self.data['standard_issues'] = issues
-            self.standard_issues = list(range(1, int(issues[:-1]) + 1))
-        elif match(r'^[1-9]\d*[\-][1-9]\d*$', issues):
-            # handle ranges, like 25-100, etc.
-            first, last = sorted(issues.split("-"), key=int)
-            self.data['standard_issues'] = '{}-{}'.format(first, last)
-            self.standard_issues = list(range(int(first), int(last) + 1))
-        elif match(r'^[1-9]\d*$', issues):
-            # handle integers
-            self.standard_issues = list(range(1, int(issues) + 1))
-            self.data['standard_issues'] = int(issues)
-        else:
+        parsed = parse_standard_issues(issues)
+        if parsed is None:
             # this should never happen with the way issue text input is designed
             self.status_bar.set_status("Not sure what to do with {} issues. Please check issues field again.", 'notice')
             self.standard_issues_text.select_all()
             return False
+        self.data['standard_issues'], self.standard_issues, self.ongoing_series = parsed
 
-        # clear standard issue container
-        self.standard_issues_container.clear_widgets()
-        # add issue toggle buttons to container
+        # show issues in container
         self.populate_issue_container(self.standard_issues_container, self.standard_issues)
         # focus on next widget
         if self.standard_issues_text.focus:
@@ -200,56 +210,19 @@ class ScreenNew(ComicsScreen):
         """ Return three sorted list containing odd_issues
                 one list to contain values like '1a, 1b, etc.'
                 and another list to int anf float values
+            followed by a list of issues conflicting with standard issues, see split_odd_issues
         """
-        # create two empty list
-        strings_list = []
-        numbers_list = []
-        special_list = []
-        error_list = []
-
-        # split numeric values from strings
-        for issue in set([i.strip() for i in odd_issues.split(',')]):
-            # handle trailing (or just extra) commas by checking if issue
-            if issue:
-                # convert to appropriate
-                issue = IssueToggleButton.convert_issue_number(issue)
-
-                if isinstance(issue, int) or isinstance(issue, float):
-                    if issue not in self.standard_issues:
-                        numbers_list.append(issue)
-                    else:
-                        error_list.append(str(issue))
-                elif isinstance(issue, str):
-                    if '_' in issue:
-                        if int(issue.split('_')[0]) in self.standard_issues:
-                            special_list.append(issue)
-                        else:
-                            error_list.append(issue)
-                    else:
-                        strings_list.append(issue)
-
-        # sort lists
-        strings_list.sort()
-        special_list.sort(key=lambda a: int(a.split('_')[0]))
-        numbers_list.sort()
-
-        # return sorted lists
-        return strings_list, special_list, numbers_list, error_list
+        return split_odd_issues(odd_issues, self.standard_issues)
 
     def load_odd_issues(self, status_bar):
 
-        self.odd_issues_container.clear_widgets()
-
         issues = self.odd_issues_text.text.strip()
 
         # split string up into different formats
         strings, specials, numbers, errors = self.create_odd_issues_lists(issues)
 
         # populate odd_issues_container
-        if strings or specials:
-            self.populate_issue_container(self.odd_issues_container, strings + specials)
-        if numbers:
-            self.populate_issue_container(self.odd_issues_container, numbers)
+        self.populate_issue_container(self.odd_issues_container, *[l for l in (strings + specials, numbers) if l])
 
         self.special_issues = specials
 
@@ -290,18 +263,20 @@ class ScreenNew(ComicsScreen):
         for n in [i.strip() for i in range_input.text.split(',')]:
             if match(r'^[1-9]\d*\-[1-9]\d*', n):
                 start, end = n.split('-')
-                issues += [str(issue) for issue in list(range(int(start), int(end) + 1))]
+                issues += [str(issue) for issue in range(int(start), int(end) + 1)]
             else:
                 issues.append(n)
 
-        for layout in layouts_list:
-            for child in layout.children:
-                if child.text in issues:
-                    print(child.text, issues)
-                    child.state = 'down'
-                    issues.remove(child.text)
-        if issues:
-            missing_issues = ', '.join(issues)
+        # select every issue found in a grid in one batch per grid, crossing it off the wanted ones
+        wanted = set(issues)
+        for grid in layouts_list:
+            found = [issue for issue in grid.issues if issue is not None and str(issue) in wanted]
+            grid.select(found)
+            wanted.difference_update(str(issue) for issue in found)
+
+        missing = [issue for issue in issues if issue in wanted]
+        if missing:
+            missing_issues = ', '.join(missing)
             self.status_bar.set_status("Something went wrong. {} not in issues.".format(missing_issues), 'notice')
             range_input.text = missing_issues
             range_input.select_all()
@@ -311,16 +286,13 @@ class ScreenNew(ComicsScreen):
 
     def select_all_issues(self, layouts_list):
 
-        for layout in layouts_list:
-
-            for child in layout.children:
-                child.state = 'down'
+        for grid in layouts_list:
+            grid.select_all()
 
     def deselect_all_issues(self, layouts_list):
 
-        for layout in layouts_list:
-            for child in layout.children:
-                child.state = 'normal'
+        for grid in layouts_list:
+            grid.select_all(owned=False)
 
     def add_new_edition(self, container, edition_name, edition_issues):
         """ Add new edition to edition's section """
@@ -357,7 +329,7 @@ class ScreenNew(ComicsScreen):
                 first, last = i.split('-')
                 issues += [ed for ed in range(int(first), int(last) + 1)]
 
-        self.other_editions_data[edition_name.text] = {'owned_issues': [], 'issues': issues}
+        self.other_editions_data[edition_name.text] = {'owned_issues': OwnedIssues(), 'issues': issues}
 
         print(self.other_editions_data)
         annuals = AnnualsEditionBox(ed_container,
@@ -392,14 +364,17 @@ class ScreenNew(ComicsScreen):
         issue_note = issue_note_widget.text
         issues = [i.strip() for i in issue_number_widget.text.split(',')]
 
+        # collect all notes first, so the notes panel only updates once
+        notes = {}
         for issue in issues:
 
             if match(r'^\d+[-]\d+$', issue):
                 start, end = issue.split('-')
                 for multi_issue in range(int(start), int(end) + 1):
-                    self.issue_notes[multi_issue] = issue_note
+                    notes[multi_issue] = issue_note
             else:
-                self.issue_notes[IssueToggleButton.convert_issue_number(issue)] = issue_note
+                notes[convert_issue_number(issue)] = issue_note
+        self.issue_notes.update(notes)
 
         issue_number_widget.text = ''
         issue_note_widget.text = ''
@@ -432,67 +407,51 @@ class ScreenNew(ComicsScreen):
 
         return publisher_list
 
-    def add_new_publisher(self, app, publisher_list):
+    def add_new_publisher(self, app, queries, db_cursor, publisher_list):
         """ Check whether any new publishers were mentioned, if so add them to database"""
 
         for p in publisher_list:
-            if not app.db_cursor().execute("SELECT * FROM PUBLISHERS where publisher IS '{}'".format(p)).fetchone():
-                app.create_publisher_table(app.db_cursor(), p)
-
-    def set_table_name(self, publisher_list):
-        """ Return table name, created from  publisher_list"""
+            if not queries.execute('publisher_id', (p,)).fetchone():
+                app.add_publisher(queries, db_cursor, p)
 
-        if len(publisher_list) > 1:
-            # if more than one publisher is selected/entered
-            return 'InterCompany'
-        else:
-            # if only one publisher is selected/entered, format name
-            return self.get_publisher_table_name(publisher_list[0])
-
-    def set_publishers(self, db_cursor, publisher_list):
+    def set_publishers(self, queries, publisher_list):
         """ Return a sorted list of publisher id numbers """
 
         publishers = []
         for p in publisher_list:
-            sql = "SELECT id FROM PUBLISHERS WHERE publisher IS '{}'".format(p)
-            publishers.append(db_cursor.execute(sql).fetchone()[0])
+            publishers.append(queries.execute('publisher_id', (p,)).fetchone()[0])
 
         return sorted(publishers)
 
-    def set_group(self, app, cur):
-        """ Prepare data['grouping'] for database """
+    def set_group(self, app, queries, db_cursor, group_chain):
+        """ Return id of the last group of group_chain, adding groups that don't exist yet """
         # set main group, which has no parent
         parent = None
-        for g in self.group_chain:
-            # query database to see if group exists
-            current = cur.execute("SELECT * FROM GROUPS WHERE name IS '{}'".format(g)).fetchone()
+        for g in group_chain:
+            # look up group to see if it exists, app.groups caches lookups of the UI thread only
+            current = queries.execute('group_by_name', (g,)).fetchone()
             if current:
                 # if it exists, nothing has to happen, except that it now becomes a potential parent
                 parent = current[0]
             else:
                 # create database entry if group doesn't exist
-                parent = app.add_new_group(cur, g, parent)
+                parent = app.add_new_group(queries, db_cursor, g, parent)
         # the last group_name should now be the potential parent and its is value gets returned
         return parent
 
-    def set_format(self, db_cursor):
-        """ Sets format field to id of selected format
+    def set_format(self, app, queries, db_cursor, format_name):
+        """ Return id of entered format, None if none was entered
             If no id is available, format will be add to formats table
         """
-        if 'format' not in self.data:
-            return False
-        elif not self.data['format']:
-            return False
+        if not format_name:
+            return None
 
         # attempt to get id of entered format
-        db_cursor.execute("SELECT id FROM FORMATS WHERE format IS '{}'".format(self.data['format']))
-        format_id = db_cursor.fetchone()
+        format_id = queries.execute('format_id', (format_name,)).fetchone()
         if not format_id:
             # add format to FORMATS table in db
-            db_cursor.execute("INSERT INTO FORMATS('format') VALUES('{}')".format(self.data['format']))
-            self.data['format'] = db_cursor.lastrowid
-        else:
-            self.data['format'] = format_id[0]
+            return app.add_format(queries, db_cursor, format_name)
+        return format_id[0]
 
     def focus_special_issue(self, special_issue_container):
         """ Focus on first top most widget of special issues if any """
@@ -529,12 +488,8 @@ class ScreenNew(ComicsScreen):
         """ Check whether issues are selected, but have higher numbers than total issues
 
             For more information read remove_excess_issues() docstring"""
-        # empty errors_list
-        self.errors = []
         # check for mistakes and add them to errors list, if necessary
-        for i in self.data['owned_issues']:
-            if i not in self.data['odd_issues'] and i not in self.standard_issues:
-                self.errors.append(i)
+        self.errors = excess_owned_issues(self.data['owned_issues'], self.standard_issues, self.data['odd_issues'])
         # give user control
         if self.errors:
             self.status_bar.confirm("You've somehow selected {} issue(s) not contained in given data. ".format(len(self.errors)) +
@@ -559,50 +514,9 @@ class ScreenNew(ComicsScreen):
     def check_collection_complete(self):
         """ Sets owned_issues to complete if all issues owned"""
 
-        if not self.ongoing_series:
-            if len(self.data['owned_issues']) == len(self.standard_issues) + len(self.data['odd_issues']):
-                self.data['owned_issues'] = 'complete'
-
-    def sql_insert_from_dict(self, dictionary, table_name):
-        """ Create an SQL command string from data dictionary """
-
-        cols = ''
-        vals = ''
-
-        for k, v in dictionary.items():
-            print(k, "->", str(v))
-
-            # set NULL string if v empty
-            if not v or v == 'None':
-                v = 'null'
-
-            # jsonify lists and dicts
-            elif isinstance(v, list) or isinstance(v, dict):
-                print('jsonifying', k)
-                v = dumps(v)
-                print("----->", v)
-
-            # escape problem characters
-            if isinstance(v, str) and "'" in v:
-                print("editing", k)
-                v = v.replace("'", "''")
-                print("to:", v)
-
-            # check if cols and vals already have values, if so add commas
-            if cols:
-                cols += ", "
-            cols += "'{}'".format(str(k))
-
-            if vals:
-                vals += ", "
-
-            if v == 'null':
-                # handle null values
-                vals += "{}".format(v)
-            else:
-                vals += "'{}'".format(v)
-
-        return "INSERT INTO '{}' ({}) VALUES ({})".format(table_name, cols, vals)
+        if collection_complete(self.data['owned_issues'], self.standard_issues, self.data['odd_issues'],
+                               self.ongoing_series):
+            self.data['owned_issues'] = 'complete'
 
     def reset_screen(self):
         """ Reset Screen to original state """
@@ -613,18 +527,20 @@ class ScreenNew(ComicsScreen):
                 self.ids[i].text = ''
             elif i.endswith('_toggle'):
                 self.ids[i].state = 'normal'
+            elif isinstance(self.ids[i], IssueGrid):
+                self.ids[i].clear()
             elif i.endswith('_container'):
                 self.ids[i].clear_widgets()
 
         # empty dictionaries and lists, etc
         self.publisher_count = 0
-        self.standard_issues = []
+        self.standard_issues = range(0)
         self.issue_notes = {}
         self.special_issues = []
 
         self.ongoing_series = False
 
-        self.data = {'odd_issues': list(), 'owned_issues': list(), 'issue_notes': dict()}
+        self.data = {'odd_issues': list(), 'owned_issues': OwnedIssues(), 'issue_notes': dict()}
         self.other_editions_data = dict()
 
         self.errors = []
@@ -650,22 +566,8 @@ class ScreenNew(ComicsScreen):
         if not self.validate_user_input():
             return False
 
-        # get cursor ready
-        cur = app.db_cursor()
-
         # update publishers if more than one is given
         publisher_list = self.create_publisher_list()
-        # add new publisher if necessary
-        self.add_new_publisher(app, publisher_list)
-
-        # set table name, depending on selected publisher(s)
-        table_name = self.set_table_name(publisher_list)
-        # set publishers list if more than one publisher was given
-        if table_name == 'InterCompany':
-            self.data['publishers'] = self.set_publishers(cur, publisher_list)
-
-        # convert entered format to format id in FORMATS table
-        self.set_format(cur)
 
         # add other_editions to data dict
         self.data['other_editions'] = self.other_editions_data
@@ -673,21 +575,112 @@ class ScreenNew(ComicsScreen):
         # check collection completeness
         self.check_collection_complete()
 
-        # set grouping
-        self.data['grouping'] = self.set_group(app, cur)
-
-
         print()
         for i in sorted(self.data):
             print("{}: '{}'".format(i, self.data[i]))
         print()
 
-        sql = self.sql_insert_from_dict(self.data, table_name)
+        # titles get written on the database thread while the screen is ready for the next one, so the queue holds
+        # encoded values instead of the screen's data, which is about to be reset
+        title = self.data['title']
+        self.batch.append((title, app.queries.title_parameters(self.data), publisher_list, list(self.group_chain)))
+        self.queued_titles = len(self.batch)
+        if not self.batch_mode or self.queued_titles >= BATCH_SIZE:
+            self.write_batch()
+        else:
+            self.batch_trigger()
+            self.status_bar.set_status("{} queued ({} of {})".format(title, self.queued_titles, BATCH_SIZE), 'normal')
+        self.reset_screen()
 
-        print(sql)
+    def write_batch(self, *args):
+        """ Write all queued titles in a single transaction on the database thread """
+
+        if not self.batch:
+            return
+        self.batch_trigger.cancel()
+        self.retry_trigger.cancel()
+        batch, self.batch = self.batch, []
+        self.queued_titles = 0
+
+        app = App.get_running_app()
+        app.jobs.write(self.insert_titles, app, batch, callback=self.batch_written,
+                       error_callback=lambda error: self.batch_failed(batch, error))
+        if len(batch) == 1:
+            self.status_bar.set_status("Adding {} to database".format(batch[0][0]), 'normal')
+        else:
+            self.status_bar.set_status("Adding {} titles to database".format(len(batch)), 'normal')
 
-        cur.execute(sql)
-        app.conn.commit()
+    def insert_titles(self, queries, app, batch):
+        """ Insert queued titles, as database job
 
-        self.status_bar.set_status(self.data['title'] + " added to database", 'success')
-        self.reset_screen()
+            Each title is written within a savepoint of its own, so a title that can't be written is rolled back
+            without keeping the others from being written. Returns (title, id of the new title or the exception it
+            raised) of every title.
+        """
+
+        results = []
+        for i, (title, parameters, publisher_list, group_chain) in enumerate(batch):
+            try:
+                with app.database.savepoint('title_{}'.format(i)):
+                    results.append((title, self.insert_title(queries, app, parameters, publisher_list, group_chain)))
+            except Exception as error:
+                print("{} rolled back: {!r}".format(title, error))
+                results.append((title, error))
+        return results
+
+    def batch_written(self, results):
+        """ Report titles added to the database, and those that could not be added """
+
+        failed = [(title, error) for title, error in results if isinstance(error, Exception)]
+        if not failed:
+            if len(results) == 1:
+                self.status_bar.set_status(results[0][0] + " added to database", 'success')
+            else:
+                self.status_bar.set_status("{} titles added to database".format(len(results)), 'success')
+        else:
+            self.status_bar.set_status("{} could not be added to database ({}), {} of {} titles added".format(
+                ', '.join(title for title, error in failed), failed[0][1], len(results) - len(failed), len(results)),
+                'error')
+
+    def batch_failed(self, batch, error):
+        """ Queue titles again after their transaction failed as a whole, eg. while the database was locked, and
+            write them again with the next batch, or after RETRY_SECONDS outside of batch entry
+        """
+
+        self.batch[:0] = batch
+        self.queued_titles = len(self.batch)
+        if self.batch_mode:
+            self.batch_trigger()
+        else:
+            self.retry_trigger()
+        self.status_bar.set_status("{} title{} could not be added to database ({}), kept queued".format(
+            len(batch), '' if len(batch) == 1 else 's', error), 'error')
+
+    def insert_title(self, queries, app, parameters, publisher_list, group_chain):
+        """ Insert title with its publishers, format and groups, adding the ones that are new
+
+            Returns the id of the new title.
+        """
+
+        # ids are set on a copy, the queued parameters stay as entered in case the title gets written again
+        parameters = dict(parameters)
+        cur = queries.conn.cursor()
+
+        # add new publisher if necessary
+        self.add_new_publisher(app, queries, cur, publisher_list)
+
+        # set publisher id, inter company cross overs get linked to their publishers after insertion
+        publisher_ids = self.set_publishers(queries, publisher_list)
+        parameters['publisher_id'] = publisher_ids[0] if len(publisher_ids) == 1 else None
+
+        # convert entered format to format id in FORMATS table
+        parameters['format'] = self.set_format(app, queries, cur, parameters['format'])
+
+        # set grouping
+        parameters['grouping'] = self.set_group(app, queries, cur, group_chain)
+
+        queries.execute('insert_title', parameters, cur)
+        title_id = cur.lastrowid
+        if len(publisher_ids) > 1:
+            app.add_title_publishers(queries, cur, title_id, publisher_ids)
+        return title_id